@@ -0,0 +1,59 @@
+import numpy as np
+
+from ChessBitboard import PIECE_NAMES
+from ChessEngine import PIECE_POSITION_SCORES
+from PieceScores import pieceScore
+
+# Scores many positions at once with the tables scoreBoard uses. A batch is
+# either an (N, 64) int8 array of piece codes, 0 for an empty square and
+# 1 + the index in PIECE_NAMES for a piece, or the (N, 12, 64) one-hot planes
+# of the same codes. Squares are in board order, row * 8 + col, so a8 is 0.
+# Checkmate and stalemate are not part of the encoding; like scoreBoard on a
+# position without those flags, only material and position are scored.
+
+# WEIGHTS[piece][square] in tenths of a pawn. Black's positional term counts
+# towards white, as it does in scoreBoard.
+WEIGHTS = np.array(
+    [
+        [
+            (10 * pieceScore[piece[1]] if piece[0] == "w" else -10 * pieceScore[piece[1]]) + PIECE_POSITION_SCORES[piece][r][c]
+            for r in range(8)
+            for c in range(8)
+        ]
+        for piece in PIECE_NAMES
+    ],
+    dtype=np.int64,
+)
+CODE_WEIGHTS = np.vstack([np.zeros((1, 64), dtype=np.int64), WEIGHTS])  # row 0 for empty squares
+
+# piece codes by the two ASCII bytes of the board strings
+CHAR_CODES = np.zeros((256, 256), dtype=np.int8)
+for code, piece in enumerate(PIECE_NAMES, 1):
+    CHAR_CODES[ord(piece[0]), ord(piece[1])] = code
+SQUARES = np.arange(64)
+
+
+def encodeBoards(boards):
+    # (N, 64) int8 codes for a list of GameState.board lists
+    text = "".join(["".join(row) for board in boards for row in board]).encode("ascii")
+    pairs = np.frombuffer(text, dtype=np.uint8).reshape(len(boards), 64, 2)
+    return CHAR_CODES[pairs[:, :, 0], pairs[:, :, 1]]
+
+
+def encodeGameStates(states):
+    return encodeBoards([gs.board for gs in states])
+
+
+def toPlanes(codes):
+    # (N, 12, 64) one-hot planes for (N, 64) codes
+    return (codes[:, None, :] == np.arange(1, 13, dtype=np.int8)[None, :, None]).astype(np.int8)
+
+
+def scoreBatch(encoded):
+    # scores in pawns from white's point of view, equal to ChessAI.scoreBoard
+    encoded = np.asarray(encoded)
+    if encoded.ndim == 3:
+        tenths = np.tensordot(encoded.astype(np.int64), WEIGHTS, axes=([1, 2], [0, 1]))
+    else:
+        tenths = CODE_WEIGHTS[encoded, SQUARES].sum(axis=1)
+    return tenths / 10
@@ -0,0 +1,257 @@
+import argparse
+import mmap
+import os
+import sys
+from collections import deque
+
+from ChessBitboard import (
+    BETWEEN,
+    BISHOP_RAYS,
+    KING_ATTACKS,
+    PAWN_ATTACKS,
+    ROOK_RAYS,
+    ROW_COL_TO_SQUARE,
+    queenAttacks,
+    rookAttacks,
+)
+
+# Bitbases for king and one piece against a lone king. A position is indexed as
+# sideToMove << 18 | strongKing << 12 | weakKing << 6 | piece with a1 = 0
+# squares from the strong side's point of view (black's pieces are mirrored),
+# sideToMove 0 for the strong side. <name>.wdl holds one bit per index: the
+# strong side to move wins, or the weak side to move loses. <name>.dtm holds
+# the distance to mate in plies, plus one, as a byte per index; KPK has no
+# .dtm because its wins go through KQK positions, and KQK is always written
+# with it. As in the engine, pawns only promote to queens.
+TABLES = {"KQK": "Q", "KRK": "R", "KPK": "P"}
+MATERIAL = {(9, 0): "KQK", (0, 9): "KQK", (5, 0): "KRK", (0, 5): "KRK", (1, 0): "KPK", (0, 1): "KPK"}
+SIZE = 1 << 19
+STRONG, WEAK = 0, 1
+PIECE_RAYS = {"Q": [rook | bishop for rook, bishop in zip(ROOK_RAYS, BISHOP_RAYS)], "R": ROOK_RAYS, "P": PAWN_ATTACKS["w"]}
+
+
+def index(sideToMove, strongKing, weakKing, piece):
+    return sideToMove << 18 | strongKing << 12 | weakKing << 6 | piece
+
+
+def pieceAttacks(kind, piece, occupied):
+    if kind == "Q":
+        return queenAttacks(piece, occupied)
+    if kind == "R":
+        return rookAttacks(piece, occupied)
+    return PAWN_ATTACKS["w"][piece]
+
+
+def attacksSquare(kind, piece, target, occupied):
+    # cheaper than pieceAttacks when only one square matters
+    if not PIECE_RAYS[kind][piece] >> target & 1:
+        return False
+    return kind == "P" or not BETWEEN[piece][target] & occupied
+
+
+def isValid(kind, sideToMove, strongKing, weakKing, piece):
+    if strongKing == weakKing or piece == strongKing or piece == weakKing:
+        return False
+    if KING_ATTACKS[strongKing] >> weakKing & 1:
+        return False
+    if kind == "P" and not 8 <= piece < 56:
+        return False
+    if sideToMove == STRONG:
+        return not attacksSquare(kind, piece, weakKing, 1 << strongKing)
+    return True
+
+
+def weakMoves(kind, strongKing, weakKing, piece):
+    # legal king moves of the weak side as (target, capturesPiece)
+    occupied = 1 << strongKing | 1 << piece
+    attacked = KING_ATTACKS[strongKing] | pieceAttacks(kind, piece, occupied)
+    moves = []
+    targets = KING_ATTACKS[weakKing]
+    while targets:
+        low = targets & -targets
+        targets ^= low
+        target = low.bit_length() - 1
+        if target == piece:
+            if not KING_ATTACKS[strongKing] >> piece & 1:
+                moves.append((target, True))
+        elif not attacked >> target & 1:
+            moves.append((target, False))
+    return moves
+
+
+def squares(bitboard):
+    while bitboard:
+        low = bitboard & -bitboard
+        bitboard ^= low
+        yield low.bit_length() - 1
+
+
+def strongPredecessors(kind, strongKing, weakKing, piece):
+    # strong-to-move positions one quiet strong move before this weak-to-move one
+    occupied = 1 << strongKing | 1 << weakKing | 1 << piece
+    for start in squares(KING_ATTACKS[strongKing] & ~occupied):
+        if isValid(kind, STRONG, start, weakKing, piece):
+            yield index(STRONG, start, weakKing, piece)
+    if kind == "P":
+        starts = []
+        if piece >= 16 and not occupied >> (piece - 8) & 1:
+            starts.append(piece - 8)
+            if 24 <= piece < 32 and not occupied >> (piece - 16) & 1:
+                starts.append(piece - 16)
+    else:
+        starts = squares(pieceAttacks(kind, piece, occupied) & ~occupied)
+    for start in starts:
+        if isValid(kind, STRONG, strongKing, weakKing, start):
+            yield index(STRONG, strongKing, weakKing, start)
+
+
+def weakPredecessors(kind, strongKing, weakKing, piece):
+    # weak-to-move positions one king move before this strong-to-move one
+    occupied = 1 << strongKing | 1 << weakKing | 1 << piece
+    for start in squares(KING_ATTACKS[weakKing] & ~occupied):
+        if isValid(kind, WEAK, strongKing, start, piece):
+            yield index(WEAK, strongKing, start, piece)
+
+
+def generate(name, queenWins=None):
+    # Retrograde analysis: start from the mates, then alternately mark strong
+    # positions with a move into a lost position as won and weak positions whose
+    # moves all lead to won positions as lost. Returns the distance table, a
+    # bytearray with distance to mate in plies plus one (0 for a draw).
+    # KPK needs the finished KQK table for its promotions.
+    kind = TABLES[name]
+    distance = bytearray(SIZE)
+    remaining = bytearray(SIZE)
+    queue = deque()
+    for strongKing in range(64):
+        for weakKing in range(64):
+            for piece in range(64):
+                if not isValid(kind, WEAK, strongKing, weakKing, piece):
+                    continue
+                moves = weakMoves(kind, strongKing, weakKing, piece)
+                position = index(WEAK, strongKing, weakKing, piece)
+                if moves:
+                    remaining[position] = len(moves)
+                elif attacksSquare(kind, piece, weakKing, 1 << strongKing):
+                    distance[position] = 1
+                    queue.append(position)
+                if kind == "P" and piece >= 48 and isValid(kind, STRONG, strongKing, weakKing, piece):
+                    promoted = piece + 8
+                    if promoted not in (strongKing, weakKing) and queenWins[index(WEAK, strongKing, weakKing, promoted)]:
+                        position = index(STRONG, strongKing, weakKing, piece)
+                        distance[position] = queenWins[index(WEAK, strongKing, weakKing, promoted)] + 1
+                        queue.append(position)
+
+    while queue:
+        position = queue.popleft()
+        sideToMove, strongKing, weakKing, piece = position >> 18, position >> 12 & 63, position >> 6 & 63, position & 63
+        if sideToMove == WEAK:
+            for predecessor in strongPredecessors(kind, strongKing, weakKing, piece):
+                if not distance[predecessor]:
+                    distance[predecessor] = min(distance[position] + 1, 255)
+                    queue.append(predecessor)
+        else:
+            for predecessor in weakPredecessors(kind, strongKing, weakKing, piece):
+                if not distance[predecessor] and remaining[predecessor]:
+                    remaining[predecessor] -= 1
+                    if not remaining[predecessor]:
+                        distance[predecessor] = min(distance[position] + 1, 255)
+                        queue.append(predecessor)
+    return distance
+
+
+def packBits(distance):
+    bits = bytearray(SIZE // 8)
+    for position in range(SIZE):
+        if distance[position]:
+            bits[position >> 3] |= 1 << (position & 7)
+    return bits
+
+
+def writeTables(directory, names=("KQK", "KRK", "KPK")):
+    os.makedirs(directory, exist_ok=True)
+    if "KPK" in names:
+        # a KPK win is played out through KQK once the pawn promotes
+        names = set(names) | {"KQK"}
+    queenWins = None
+    for name in ("KQK", "KRK", "KPK"):
+        if name not in names:
+            continue
+        distance = generate(name, queenWins)
+        if name == "KQK":
+            queenWins = distance
+        with open(os.path.join(directory, name + ".wdl"), "wb") as tableFile:
+            tableFile.write(packBits(distance))
+        if name != "KPK":
+            with open(os.path.join(directory, name + ".dtm"), "wb") as tableFile:
+                tableFile.write(distance)
+
+
+class Bitbases:
+    # Tables in a directory written by writeTables. Each file is memory mapped
+    # the first time a position needs it; missing files are never probed.
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.maps = {}
+
+    def getMap(self, fileName):
+        if fileName not in self.maps:
+            path = os.path.join(self.directory, fileName)
+            if os.path.exists(path):
+                with open(path, "rb") as tableFile:
+                    self.maps[fileName] = mmap.mmap(tableFile.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.maps[fileName] = None
+        return self.maps[fileName]
+
+    def close(self):
+        for tableMap in self.maps.values():
+            if tableMap is not None:
+                tableMap.close()
+        self.maps = {}
+
+    def probe(self, gs):
+        # (result, plies to mate) for the side to move, result 1 for a win, -1
+        # for a loss and 0 for a draw; plies is None when only the WDL table
+        # is known. None when the position is not in a table.
+        name = MATERIAL.get((gs.materialScore["w"], gs.materialScore["b"]))
+        if name is None:
+            return None
+        strongColor = "w" if gs.materialScore["w"] else "b"
+        pieces = {}
+        count = 0
+        for r in range(8):
+            for c in range(8):
+                piece = gs.board[r][c]
+                if piece != "--":
+                    count += 1
+                    pieces[piece] = ROW_COL_TO_SQUARE[r][c]
+        kind = TABLES[name]
+        if count != 3 or strongColor + kind not in pieces:
+            return None
+        wdl = self.getMap(name + ".wdl")
+        if wdl is None:
+            return None
+        flip = 0 if strongColor == "w" else 56
+        weakColor = "b" if strongColor == "w" else "w"
+        sideToMove = STRONG if gs.whiteToMove == (strongColor == "w") else WEAK
+        position = index(sideToMove, pieces[strongColor + "K"] ^ flip, pieces[weakColor + "K"] ^ flip, pieces[strongColor + kind] ^ flip)
+        if not wdl[position >> 3] >> (position & 7) & 1:
+            return 0, None
+        dtm = self.getMap(name + ".dtm")
+        plies = dtm[position] - 1 if dtm is not None else None
+        return (1 if sideToMove == STRONG else -1), plies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the KQK, KRK and KPK bitbases.")
+    parser.add_argument("directory", help="where to write the tables")
+    parser.add_argument("--tables", nargs="+", choices=sorted(TABLES), default=["KQK", "KRK", "KPK"])
+    args = parser.parse_args(argv)
+    writeTables(args.directory, args.tables)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
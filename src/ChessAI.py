@@ -1,79 +1,43 @@
+import atexit
+import os
+import queue
 import random
-
-pieceScore = {'K':0, 'Q':9, 'R':5, 'B':3, 'N':3, 'P':1}
-
-
-knightScores = [
-    [1, 1, 1, 1, 1, 1, 1, 1],
-    [1, 2, 2, 2, 2, 2, 2, 1],
-    [1, 2, 3, 3, 3, 3, 2, 1],
-    [1, 2, 3, 4, 4, 3, 2, 1],
-    [1, 2, 3, 4, 4, 3, 2, 1],
-    [1, 2, 3, 3, 3, 3, 2, 1],
-    [1, 2, 2, 2, 2, 2, 2, 1],
-    [1, 1, 1, 1, 1, 1, 1, 1],]
-
-
-bishopScores = [
-    [4, 3, 2, 1, 1, 2, 3, 4],
-    [3, 4, 3, 2, 2, 3, 4, 3],
-    [2, 3, 4, 3, 3, 4, 3, 2],
-    [1, 2, 3, 4, 4, 3, 2, 1],
-    [1, 2, 3, 4, 4, 3, 2, 1],
-    [2, 3, 4, 3, 3, 4, 3, 2],
-    [3, 4, 3, 2, 2, 3, 4, 3],
-    [4, 3, 2, 1, 1, 2, 3, 4],]
-
-
-queenScores = [
-    [1, 1, 1, 3, 1, 1, 1, 1],
-    [1, 2, 3, 3, 3, 1, 1, 1],
-    [1, 4, 3, 3, 3, 4, 2, 1],
-    [1, 2, 3, 3, 3, 2, 2, 1],
-    [1, 2, 3, 3, 3, 2, 2, 1],
-    [1, 4, 3, 3, 3, 4, 2, 1],
-    [1, 2, 3, 3, 3, 1, 1, 1],
-    [1, 1, 1, 3, 1, 1, 1, 1],]
-
-
-rockScores = [
-    [4, 3, 4, 4, 4, 4, 3, 4],
-    [4, 4, 4, 4, 4, 4, 4, 4],
-    [1, 1, 2, 3, 3, 2, 1, 1],
-    [1, 2, 3, 4, 4, 3, 2, 1],
-    [1, 2, 3, 4, 4, 3, 2, 1],
-    [1, 1, 2, 3, 3, 2, 1, 1],
-    [4, 4, 4, 4, 4, 4, 4, 4],
-    [4, 3, 4, 4, 4, 4, 3, 4],]
-
-
-whitePawnScores = [
-    [8, 8, 8, 8, 8, 8, 8, 8],
-    [8, 8, 8, 8, 8, 8, 8, 8],
-    [5, 6, 6, 7, 7, 6, 6, 5],
-    [2, 3, 3, 5, 5, 3, 3, 2],
-    [1, 2, 3, 4, 4, 3, 2, 1],
-    [1, 1, 2, 3, 3, 2, 1, 1],
-    [1, 1, 1, 0, 0, 1, 1, 1],
-    [0, 0, 0, 0, 0, 0, 0, 0],]
-
-
-blackPawnScores = [
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [1, 1, 1, 0, 0, 1, 1, 1],
-    [1, 1, 2, 3, 3, 2, 1, 1],
-    [1, 2, 3, 4, 4, 3, 2, 1],
-    [2, 3, 3, 5, 5, 3, 3, 2],
-    [5, 6, 6, 7, 7, 6, 6, 5],
-    [8, 8, 8, 8, 8, 8, 8, 8],
-    [8, 8, 8, 8, 8, 8, 8, 8],
-]
-
-piecePositionScores = {'Q':queenScores, 'R':rockScores, 'B':bishopScores, 'N':knightScores, 'wP':whitePawnScores, 'bP':blackPawnScores}
+import sys
+import time
+from multiprocessing import Event, Process, Queue, shared_memory
+import ChessEngine
+from Bitbases import Bitbases
+from OpeningBook import OpeningBook
+from TranspositionTable import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable, tableBytes
+from PieceScores import pieceScore, piecePositionScores
 
 CHECKMATE = 1000
 STALEMATE = 0
+BITBASE_WIN = 500 # a won bitbase position, less a tenth per ply to mate
 DEPTH = 4
+MAX_DEPTH = 64
+MATE_SCORE = CHECKMATE - 2 * MAX_DEPTH # the search scores a mate as CHECKMATE less its plies from the root
+HASH_SIZE_MB = 16
+DELTA_MARGIN = 2 # a capture must be able to lift the score this close to alpha
+QUIESCENCE_CHECK_PLIES = 4 # quiescence plies in which a side in check searches all evasions
+SEARCH_WORKERS = os.cpu_count() or 1 # processes findBestMoveParallel runs by default
+# methods timed by enableProfiling, by section
+PROFILE_SECTIONS = {
+    "movegen": ("getValidMoves", "getCaptureMoves", "getQuietMoves"),
+    "make/undo": ("makeMove", "undoMove"),
+    "eval": ("scoreBoard",),
+}
+
+transpositionTable = TranspositionTable(HASH_SIZE_MB)
+killerMoves = [[0, 0] for _ in range(MAX_DEPTH + 1)] # two quiet cutoff move IDs per ply
+historyTable = {} # moveID -> how often the quiet move caused a cutoff, weighted by depth
+searchStats = None # SearchStats of the current or last search
+searchStopEvent = None # set by another process to stop the search early
+sharedHash = None # shared memory block holding the parallel search's table
+openingBook = None # OpeningBook consulted before searching, see useOpeningBook
+bitbases = None # KQK, KRK and KPK tables probed in the search, see useBitbases
+profiledMethods = [] # (owner, name, original) replaced while profiling is enabled
+profileDepth = 0 # > 0 inside a timed section
 
 
 def findRandomMove(validMoves):
@@ -115,17 +79,432 @@ def findBestMoveThings(gs,validMoves):
     return bestPlayerMove
 
 
-def findBestMove(gs, validMoves, returnQueue):
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchStats:
+    # Counters of one search, returned by findBestMove with its move. depths
+    # holds (depth, seconds, nodes) for every finished iteration; the section
+    # times are only filled in while profiling is enabled. source says where
+    # the move came from: "search", "book" or "bitbase".
+    __slots__ = (
+        "source",
+        "nodes",
+        "quiescenceNodes",
+        "betaCutoffs",
+        "firstMoveCutoffs",
+        "hashProbes",
+        "hashHits",
+        "depths",
+        "seconds",
+        "sectionSeconds",
+        "sectionCalls",
+    )
+
+    def __init__(self, source="search"):
+        self.source = source
+        self.nodes = 0
+        self.quiescenceNodes = 0
+        self.betaCutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.hashProbes = 0
+        self.hashHits = 0
+        self.depths = []
+        self.seconds = 0.0
+        self.sectionSeconds = {}
+        self.sectionCalls = {}
+
+    def totalNodes(self):
+        return self.nodes + self.quiescenceNodes
+
+    def firstMoveCutoffRate(self):
+        return self.firstMoveCutoffs / self.betaCutoffs if self.betaCutoffs else 0.0
+
+    def hashHitRate(self):
+        return self.hashHits / self.hashProbes if self.hashProbes else 0.0
+
+    def branchingFactor(self):
+        # nodes of the last iteration over those of the one before
+        if len(self.depths) < 2 or not self.depths[-2][2]:
+            return 0.0
+        return self.depths[-1][2] / self.depths[-2][2]
+
+    def nodesPerSecond(self):
+        return self.totalNodes() / self.seconds if self.seconds else 0.0
+
+    def add(self, other):
+        # counts of another worker's search of the same position
+        self.nodes += other.nodes
+        self.quiescenceNodes += other.quiescenceNodes
+        self.betaCutoffs += other.betaCutoffs
+        self.firstMoveCutoffs += other.firstMoveCutoffs
+        self.hashProbes += other.hashProbes
+        self.hashHits += other.hashHits
+        if len(other.depths) > len(self.depths):
+            self.depths = other.depths
+        self.seconds = max(self.seconds, other.seconds)
+        for section, seconds in other.sectionSeconds.items():
+            self.sectionSeconds[section] = self.sectionSeconds.get(section, 0.0) + seconds
+            self.sectionCalls[section] = self.sectionCalls.get(section, 0) + other.sectionCalls[section]
+
+    def __str__(self):
+        if self.source != "search":
+            return self.source + " move"
+        text = "%d nodes, %d quiescence nodes, depth %d, %.2fs, %d nps, branching %.2f, first move cutoffs %.2f, hash hits %.2f" % (
+            self.nodes,
+            self.quiescenceNodes,
+            self.depths[-1][0] if self.depths else 0,
+            self.seconds,
+            self.nodesPerSecond(),
+            self.branchingFactor(),
+            self.firstMoveCutoffRate(),
+            self.hashHitRate(),
+        )
+        for section, seconds in sorted(self.sectionSeconds.items(), key=lambda item: -item[1]):
+            text += "\n  %-10s %7.3fs %9d calls" % (section, seconds, self.sectionCalls[section])
+        return text
+
+
+def enableProfiling():
+    # Wraps the methods in PROFILE_SECTIONS in timers that add to searchStats.
+    # A call made inside a timed section counts towards that section, so the
+    # legality checks in move generation are movegen time. With profiling
+    # disabled nothing is wrapped and the search pays nothing for the hooks.
+    if profiledMethods:
+        return
+    owners = list(dict.fromkeys(ChessEngine.BACKENDS.values())) + [sys.modules[__name__]]
+    for section, names in PROFILE_SECTIONS.items():
+        for owner in owners:
+            for name in names:
+                if name in vars(owner):
+                    original = vars(owner)[name]
+                    profiledMethods.append((owner, name, original))
+                    setattr(owner, name, timedSection(section, original))
+
+
+def disableProfiling():
+    while profiledMethods:
+        owner, name, original = profiledMethods.pop()
+        setattr(owner, name, original)
+
+
+def timedSection(section, function):
+    def timed(*args, **kwargs):
+        global profileDepth
+        if profileDepth or searchStats is None:
+            return function(*args, **kwargs)
+        profileDepth = 1
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profileDepth = 0
+            searchStats.sectionSeconds[section] = searchStats.sectionSeconds.get(section, 0.0) + time.perf_counter() - start
+            searchStats.sectionCalls[section] = searchStats.sectionCalls.get(section, 0) + 1
+
+    return timed
+
+
+def useOpeningBook(path):
+    # path of a book built with OpeningBook.py, None to play without one
+    global openingBook
+    if openingBook is not None:
+        openingBook.close()
+    openingBook = OpeningBook(path) if path is not None else None
+
+
+def useBitbases(directory):
+    # directory of tables written by Bitbases.py, None to search without them
+    global bitbases
+    if bitbases is not None:
+        bitbases.close()
+    bitbases = Bitbases(directory) if directory is not None else None
+
+
+def bitbaseScore(gs, turnMultiplier):
+    # score for the side to move of a position in the bitbases, None otherwise
+    entry = bitbases.probe(gs) if bitbases is not None else None
+    if entry is None:
+        return None
+    result, plies = entry
+    if result == 0:
+        return STALEMATE
+    if plies is None:
+        # KPK only knows won or drawn: the evaluation pushes the pawn on, and
+        # half the win score makes promoting into KQK better still
+        return result * BITBASE_WIN / 2 + turnMultiplier * scoreBoard(gs)
+    return result * (BITBASE_WIN - plies / 10)
+
+
+def findBitbaseMove(gs, validMoves):
+    # Every move from a bitbase position leads to another one or to bare
+    # kings, so the best move is one lookup per move. A move into a table that
+    # is not loaded, a promotion without KQK, leaves the choice to the search.
+    turnMultiplier = 1 if gs.whiteToMove else -1
+    if bitbaseScore(gs, turnMultiplier) is None:
+        return None
+    bestMove = None
+    maxScore = -CHECKMATE
+    for move in validMoves:
+        gs.makeMove(move)
+        score = bitbaseScore(gs, -turnMultiplier)
+        bareKings = not gs.materialScore["w"] and not gs.materialScore["b"]
+        gs.undoMove()
+        if score is None and not bareKings:
+            return None
+        score = -score if score is not None else STALEMATE
+        if score > maxScore:
+            maxScore = score
+            bestMove = move
+    return bestMove
+
+
+def findBookMove(gs, validMoves):
+    if openingBook is None:
+        return None
+    return openingBook.findMove(gs, validMoves)
+
+
+def findInstantMove(gs, validMoves):
+    # (move, SearchStats) for a move that needs no search, (None, None) otherwise
+    move = findBookMove(gs, validMoves)
+    if move is not None:
+        return move, SearchStats("book")
+    move = findBitbaseMove(gs, validMoves)
+    if move is not None:
+        return move, SearchStats("bitbase")
+    return None, None
+
+
+def findBestMove(gs, validMoves, returnQueue, timeLimitMs=None, nodeLimit=None, maxDepth=None):
+    # puts the move into returnQueue and returns it with the search's SearchStats
+    instantMove, instantStats = findInstantMove(gs, validMoves)
+    if instantMove is not None:
+        returnQueue.put(instantMove)
+        return instantMove, instantStats
+    bestMove = None
+    for _, _, bestMove in searchIterations(gs, validMoves, timeLimitMs, nodeLimit, 1, maxDepth):
+        pass
+    returnQueue.put(bestMove)
+    return bestMove, searchStats
+
+
+def searchIterations(gs, validMoves, timeLimitMs=None, nodeLimit=None, startDepth=1, maxDepth=None):
+    # Iterative deepening: search depth 1, 2, 3, ... and yield (depth, score, move)
+    # for every iteration that finished. Without limits it stops at DEPTH as
+    # before; with a time or node budget it goes as deep as the budget allows,
+    # up to maxDepth when that is given.
     global nextMove
-    global counter
+    global searchStats
+    global searchDepth
+    global searchDeadline
+    global searchNodeLimit
     nextMove = None
     random.shuffle(validMoves)
-    counter = 0
-    # findMoveMinMax(gs, validMoves, DEPTH, gs.whiteToMove)
-    # findMoveNegaMax(gs, validMoves, DEPTH, 1 if gs.whiteToMove else -1)
-    findMoveNegaMaxAlphaBeta(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
-    print(counter)
-    returnQueue.put(nextMove)
+    stats = searchStats = SearchStats()
+    probes, hits = transpositionTable.probes, transpositionTable.hits
+    for killers in killerMoves:
+        killers[0] = killers[1] = 0
+    for moveID in historyTable:
+        historyTable[moveID] //= 2
+    startTime = time.time()
+    searchDeadline = startTime + timeLimitMs / 1000 if timeLimitMs is not None else None
+    searchNodeLimit = nodeLimit
+    if maxDepth is None:
+        maxDepth = DEPTH if timeLimitMs is None and nodeLimit is None else MAX_DEPTH
+    movesMade = len(gs.moveLog)
+
+    bestMove = None
+    try:
+        for searchDepth in range(min(startDepth, maxDepth), maxDepth + 1):
+            iterationStart = time.time()
+            iterationNodes = stats.totalNodes()
+            try:
+                # findMoveMinMax(gs, validMoves, DEPTH, gs.whiteToMove)
+                # findMoveNegaMax(gs, validMoves, DEPTH, 1 if gs.whiteToMove else -1)
+                score = findMoveNegaMaxAlphaBeta(gs, validMoves, searchDepth, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
+            except SearchTimeout:
+                # unwind the moves the interrupted iteration left on the board
+                while len(gs.moveLog) > movesMade:
+                    gs.undoMove()
+                break
+            stats.depths.append((searchDepth, time.time() - iterationStart, stats.totalNodes() - iterationNodes))
+            if nextMove is not None:
+                bestMove = nextMove
+                # search the previous best move first in the next iteration
+                validMoves = [bestMove] + [move for move in validMoves if move is not bestMove]
+            stats.seconds = time.time() - startTime
+            yield searchDepth, score, bestMove
+            if abs(score) >= MATE_SCORE:
+                break
+            # the next iteration takes several times longer than this one, so do not
+            # start it when it has no chance to finish
+            if searchDeadline is not None and time.time() - startTime > (searchDeadline - startTime) / 2:
+                break
+    finally:
+        stats.seconds = time.time() - startTime
+        stats.hashProbes = transpositionTable.probes - probes
+        stats.hashHits = transpositionTable.hits - hits
+
+
+def findBestMoveParallel(gs, validMoves, returnQueue, timeLimitMs=None, nodeLimit=None, workers=SEARCH_WORKERS, maxDepth=None):
+    # Lazy SMP: every worker process searches the same root with its own move
+    # order, and half of them start one ply deeper. They only cooperate through
+    # a transposition table in shared memory, so one worker's results cut the
+    # others' trees short. The deepest completed iteration wins. nodeLimit
+    # applies to each worker.
+    global sharedHash
+    instantMove, instantStats = findInstantMove(gs, validMoves)
+    if instantMove is not None:
+        returnQueue.put(instantMove)
+        return instantMove, instantStats
+    if sharedHash is None:
+        sharedHash = shared_memory.SharedMemory(create=True, size=tableBytes(HASH_SIZE_MB))
+        atexit.register(releaseSharedHash)
+    results = Queue()
+    stopEvent = Event()
+    processes = [
+        Process(target=searchWorker, args=(gs, validMoves, sharedHash, index, timeLimitMs, nodeLimit, maxDepth, results, stopEvent), daemon=True)
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    bestDepth, bestWorker, bestIndex = 0, None, None
+    stats = SearchStats()
+    running = workers
+    while running:
+        try:
+            message = results.get(timeout=0.05)
+        except queue.Empty:
+            # pass a stop request from our own caller on to the workers
+            if searchStopEvent is not None and searchStopEvent.is_set():
+                stopEvent.set()
+            continue
+        if message[0] == "done":
+            # once one worker has finished the others have nothing left to add
+            stopEvent.set()
+            stats.add(message[2])
+            running -= 1
+            continue
+        _, workerIndex, depth, moveIndex = message
+        if depth > bestDepth or (depth == bestDepth and workerIndex < bestWorker):
+            bestDepth, bestWorker, bestIndex = depth, workerIndex, moveIndex
+    for process in processes:
+        process.join()
+
+    bestMove = validMoves[bestIndex] if bestIndex is not None else None
+    returnQueue.put(bestMove)
+    return bestMove, stats
+
+
+def searchWorker(gs, validMoves, sharedBlock, workerIndex, timeLimitMs, nodeLimit, maxDepth, results, stopEvent):
+    global transpositionTable
+    global searchStopEvent
+    transpositionTable = TranspositionTable(HASH_SIZE_MB, sharedBlock.buf)
+    searchStopEvent = stopEvent
+    # forked workers inherit the same random state, reseed so move orders differ
+    random.seed()
+    try:
+        for depth, score, move in searchIterations(gs, list(validMoves), timeLimitMs, nodeLimit, 1 + workerIndex % 2, maxDepth):
+            results.put(("depth", workerIndex, depth, validMoves.index(move)))
+    finally:
+        results.put(("done", workerIndex, searchStats))
+        transpositionTable.release()
+
+
+def clearHash():
+    transpositionTable.clear()
+    historyTable.clear()
+    if sharedHash is not None:
+        sharedHash.buf[:] = bytes(sharedHash.size)
+
+
+def releaseSharedHash():
+    global sharedHash
+    if sharedHash is not None:
+        sharedHash.close()
+        sharedHash.unlink()
+        sharedHash = None
+
+
+def orderMoves(validMoves, hashMoveID, ply):
+    # hash/PV move, captures by victim minus attacker value, promotions,
+    # killer moves, then quiet moves by history score
+    killers = killerMoves[ply]
+
+    def orderKey(move):
+        if move.moveID == hashMoveID:
+            return (5, 0)
+        if move.isCapture:
+            return (4, pieceScore[move.pieceCaptured[1]] - pieceScore[move.pieceMoved[1]])
+        if move.isPawnPromotion:
+            return (3, 0)
+        if move.moveID == killers[0]:
+            return (2, 1)
+        if move.moveID == killers[1]:
+            return (2, 0)
+        return (1, historyTable.get(move.moveID, 0))
+
+    return sorted(validMoves, key=orderKey, reverse=True)
+
+
+def stagedMoves(gs, hashMoveID, ply):
+    # Yields the legal moves in the order orderMoves would sort them, but makes
+    # each stage only once the earlier ones failed to cut off: hash move,
+    # captures that do not lose material, killers, quiet moves by history, and
+    # last the captures of a defended cheaper piece.
+    captures = gs.getCaptureMoves()
+    quietMoves = None
+    hashMove = None
+    if hashMoveID:
+        for move in captures:
+            if move.moveID == hashMoveID:
+                hashMove = move
+                break
+        else:
+            quietMoves = gs.getQuietMoves()
+            for move in quietMoves:
+                if move.moveID == hashMoveID:
+                    hashMove = move
+                    break
+        if hashMove is not None:
+            yield hashMove
+
+    losingCaptures = []
+    for move in orderCaptures(captures):
+        if move is hashMove:
+            continue
+        if move.isCapture and pieceScore[move.pieceCaptured[1]] < pieceScore[move.pieceMoved[1]] and gs.squareUnderAttack(move.endRow, move.endCol):
+            losingCaptures.append(move)
+        else:
+            yield move
+
+    if quietMoves is None:
+        quietMoves = gs.getQuietMoves()
+    killers = killerMoves[ply][:]
+    for killer in killers:
+        if killer and killer != hashMoveID:
+            for move in quietMoves:
+                if move.moveID == killer:
+                    yield move
+                    break
+    yield from sorted(
+        (move for move in quietMoves if move.moveID != hashMoveID and move.moveID not in killers),
+        key=lambda move: historyTable.get(move.moveID, 0),
+        reverse=True,
+    )
+    yield from losingCaptures
+
+
+def checkSearchLimits():
+    if searchStopEvent is not None and searchStopEvent.is_set():
+        raise SearchTimeout
+    if searchNodeLimit is not None and searchStats.totalNodes() >= searchNodeLimit:
+        raise SearchTimeout
+    if searchDeadline is not None and time.time() >= searchDeadline:
+        raise SearchTimeout
 
 
 def findMoveMinMax(gs, validMoves, depth, whiteToMove):
@@ -162,8 +541,7 @@ def findMoveMinMax(gs, validMoves, depth, whiteToMove):
 
 def findMoveNegaMax(gs, validMoves, depth, turnMultiplier):
     global nextMove
-    global counter
-    counter+=1
+    searchStats.nodes += 1
     if depth == 0:
         return turnMultiplier * scoreBoard(gs)
     
@@ -182,22 +560,64 @@ def findMoveNegaMax(gs, validMoves, depth, turnMultiplier):
 
 def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier):
     global nextMove
-    global counter
-    counter+=1
+    stats = searchStats
+    stats.nodes += 1
+    # depth 1 always finishes so there is a move to return
+    if stats.nodes & 255 == 0 and searchDepth > 1:
+        checkSearchLimits()
+    # a repeated position is scored as the draw it can be made into, and fifty
+    # moves without a capture or pawn move are a draw, whatever lies below
+    if depth != searchDepth and gs.isRepetition():
+        return STALEMATE
+    if depth != searchDepth and gs.halfmoveClock >= 100:
+        # unless the move that reached the hundredth ply gave mate
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+        if not gs.checkMate:
+            return STALEMATE
+    if depth != searchDepth and bitbases is not None:
+        score = bitbaseScore(gs, turnMultiplier)
+        if score is not None:
+            return score
     if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
-    
-    #move ordering - implement later
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+        return quiescenceSearch(gs, alpha, beta, turnMultiplier, 0, validMoves)
+
+    originalAlpha = alpha
+    hashMoveID = 0
+    ply = searchDepth - depth
+    entry = transpositionTable.probe(gs.zobristKey)
+    if entry is not None:
+        entryDepth, entryScore, bound, hashMoveID = entry
+        entryScore = scoreFromHash(entryScore, ply)
+        # the root always searches so that nextMove gets set
+        if entryDepth >= depth and depth != searchDepth:
+            if bound == EXACT:
+                return entryScore
+            elif bound == LOWER_BOUND:
+                alpha = max(alpha, entryScore)
+            else:
+                beta = min(beta, entryScore)
+            if alpha >= beta:
+                return entryScore
+
+    # below the root the moves are generated stage by stage as they are needed
+    if validMoves is None:
+        moves = stagedMoves(gs, hashMoveID, ply)
+    else:
+        moves = orderMoves(validMoves, hashMoveID, ply)
 
-    
     maxScore = -CHECKMATE
-    for move in validMoves:
+    bestMove = None
+    moveIndex = -1
+    for moveIndex, move in enumerate(moves):
         gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth-1, -beta, -alpha, -turnMultiplier)
+        score = -findMoveNegaMaxAlphaBeta(gs, None, depth-1, -beta, -alpha, -turnMultiplier)
         if score > maxScore:
             maxScore = score
-            if depth == DEPTH:
+            bestMove = move
+            if depth == searchDepth:
                 nextMove = move
         gs.undoMove()
         
@@ -205,10 +625,118 @@ def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier)
             alpha = maxScore
         
         if alpha >= beta:
+            recordCutoff(move, moveIndex, depth, ply)
             break
+
+    # the staged generators do not set staleMate, so a node without moves
+    # is only mate when in check
+    if moveIndex < 0:
+        maxScore = -CHECKMATE + ply if gs.incheck() else STALEMATE
+
+    if maxScore <= originalAlpha:
+        bound = UPPER_BOUND
+    elif maxScore >= beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    transpositionTable.store(gs.zobristKey, depth, scoreToHash(maxScore, ply), bound, bestMove.moveID if bestMove else 0)
     return maxScore
 
 
+def scoreToHash(score, ply):
+    # mates are stored as plies from the node rather than from the root, so
+    # that they hold wherever in the tree the position comes up again
+    if score >= MATE_SCORE:
+        return score + ply
+    if score <= -MATE_SCORE:
+        return score - ply
+    return score
+
+
+def scoreFromHash(score, ply):
+    if score >= MATE_SCORE:
+        return score - ply
+    if score <= -MATE_SCORE:
+        return score + ply
+    return score
+
+
+def quiescenceSearch(gs, alpha, beta, turnMultiplier, qPly=0, validMoves=None):
+    # Search captures (and promotions) until the position is quiet, so the
+    # horizon never scores a position with a piece hanging. validMoves, when
+    # given, are the legal moves of this node, already generated by the parent.
+    if qPly > 0:
+        # the first node is the main search leaf and is counted there
+        stats = searchStats
+        stats.quiescenceNodes += 1
+        if stats.quiescenceNodes & 255 == 0 and searchDepth > 1:
+            checkSearchLimits()
+
+    if gs.checkMate:
+        return -CHECKMATE + searchDepth + qPly
+    if gs.staleMate:
+        return STALEMATE
+
+    inCheck = gs.inCheck if qPly == 0 and validMoves is not None else gs.incheck()
+    if inCheck and qPly < QUIESCENCE_CHECK_PLIES:
+        # no standing pat while in check, every evasion is searched
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+            if gs.checkMate:
+                return -CHECKMATE + searchDepth + qPly
+        moves = orderCaptures(validMoves)
+        maxScore = -CHECKMATE
+        standPat = None
+    else:
+        standPat = turnMultiplier * scoreBoard(gs)
+        if standPat >= beta:
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+        moves = orderCaptures(gs.getCaptureMoves())
+        maxScore = standPat
+
+    for move in moves:
+        if standPat is not None:
+            # delta pruning: skip captures that cannot bring the score back to alpha
+            gain = pieceScore[move.pieceCaptured[1]] if move.isCapture else 0
+            if move.isPawnPromotion:
+                gain += pieceScore['Q'] - pieceScore['P']
+            if standPat + gain + DELTA_MARGIN <= alpha:
+                continue
+        gs.makeMove(move)
+        score = -quiescenceSearch(gs, -beta, -alpha, -turnMultiplier, qPly + 1)
+        gs.undoMove()
+        if score > maxScore:
+            maxScore = score
+        if maxScore > alpha:
+            alpha = maxScore
+        if alpha >= beta:
+            break
+    return maxScore
+
+
+def orderCaptures(moves):
+    # most valuable victim first, least valuable attacker first among equals
+    return sorted(
+        moves,
+        key=lambda move: (pieceScore[move.pieceCaptured[1]] if move.isCapture else 0) - pieceScore[move.pieceMoved[1]],
+        reverse=True,
+    )
+
+
+def recordCutoff(move, moveIndex, depth, ply):
+    searchStats.betaCutoffs += 1
+    if moveIndex == 0:
+        searchStats.firstMoveCutoffs += 1
+    if not move.isCapture:
+        killers = killerMoves[ply]
+        if killers[0] != move.moveID:
+            killers[1] = killers[0]
+            killers[0] = move.moveID
+        historyTable[move.moveID] = historyTable.get(move.moveID, 0) + depth * depth
+
+
 def scoreBoard(gs):
     if gs.checkMate:
         if gs.whiteToMove:
@@ -218,6 +746,21 @@ def scoreBoard(gs):
     elif gs.staleMate:
         return STALEMATE
 
+    # GameState keeps these totals up to date in makeMove/undoMove, in tenths so
+    # that they add up exactly
+    return (10 * (gs.materialScore["w"] - gs.materialScore["b"]) + gs.positionScore["w"] + gs.positionScore["b"]) / 10
+
+
+def scoreBoardScan(gs):
+    # full scan of the board, the reference for the running totals in GameState
+    if gs.checkMate:
+        if gs.whiteToMove:
+            return -CHECKMATE #black wins
+        else:
+            return CHECKMATE #white wins
+    elif gs.staleMate:
+        return STALEMATE
+
     score = 0
     for row in range(len(gs.board)):
         for col in range(len(gs.board[row])):
@@ -234,12 +777,13 @@ def scoreBoard(gs):
                     else:
                         piecePositionScore = piecePositionScores[square[1]][row][col]
 
+                # black's positional term counts towards white, as it always has
                 if square[0] == 'w':
-                    score += pieceScore[square[1]] + piecePositionScore * .1
+                    score += pieceScore[square[1]] * 10 + piecePositionScore
                 elif square[0] == 'b':
-                    score -= pieceScore[square[1]] - piecePositionScore * .1
+                    score -= pieceScore[square[1]] * 10 - piecePositionScore
 
-    return score
+    return score / 10
 
 
 def scoreMaterial(board):
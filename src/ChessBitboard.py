@@ -0,0 +1,153 @@
+# Bitboard primitives shared by the bitboard GameState backend.
+# Squares are numbered rank * 8 + file, so a1 = 0, h1 = 7, a8 = 56 and h8 = 63.
+# GameState.board[row][col] lives on square (7 - row) * 8 + col.
+
+A1, B1, C1, D1, E1, F1, G1, H1 = 0, 1, 2, 3, 4, 5, 6, 7
+A2, B2, C2, D2, E2, F2, G2, H2 = 8, 9, 10, 11, 12, 13, 14, 15
+A3, B3, C3, D3, E3, F3, G3, H3 = 16, 17, 18, 19, 20, 21, 22, 23
+A4, B4, C4, D4, E4, F4, G4, H4 = 24, 25, 26, 27, 28, 29, 30, 31
+A5, B5, C5, D5, E5, F5, G5, H5 = 32, 33, 34, 35, 36, 37, 38, 39
+A6, B6, C6, D6, E6, F6, G6, H6 = 40, 41, 42, 43, 44, 45, 46, 47
+A7, B7, C7, D7, E7, F7, G7, H7 = 48, 49, 50, 51, 52, 53, 54, 55
+A8, B8, C8, D8, E8, F8, G8, H8 = 56, 57, 58, 59, 60, 61, 62, 63
+
+FULL = (1 << 64) - 1
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+
+PIECE_NAMES = ["wP", "wR", "wN", "wB", "wQ", "wK", "bP", "bR", "bN", "bB", "bQ", "bK"]
+
+SQUARE_TO_ROW_COL = [(7 - sq // 8, sq % 8) for sq in range(64)]
+ROW_COL_TO_SQUARE = [[(7 - r) * 8 + c for c in range(8)] for r in range(8)]
+
+
+def squareOf(r, c):
+    return (7 - r) * 8 + c
+
+
+def squaresOf(bitboard):
+    squares = []
+    while bitboard:
+        low = bitboard & -bitboard
+        squares.append(low.bit_length() - 1)
+        bitboard ^= low
+    return squares
+
+
+def popCount(bitboard):
+    return bitboard.bit_count()
+
+
+def _leaperAttacks(offsets):
+    table = []
+    for sq in range(64):
+        rank, file = divmod(sq, 8)
+        attacks = 0
+        for dRank, dFile in offsets:
+            if 0 <= rank + dRank < 8 and 0 <= file + dFile < 8:
+                attacks |= 1 << ((rank + dRank) * 8 + file + dFile)
+        table.append(attacks)
+    return table
+
+
+KNIGHT_ATTACKS = _leaperAttacks([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+KING_ATTACKS = _leaperAttacks([(1, -1), (1, 0), (1, 1), (0, -1), (0, 1), (-1, -1), (-1, 0), (-1, 1)])
+# squares a pawn of the given colour standing on sq attacks
+PAWN_ATTACKS = {"w": _leaperAttacks([(1, -1), (1, 1)]), "b": _leaperAttacks([(-1, -1), (-1, 1)])}
+
+# Ray directions as (rank step, file step). The first four run towards higher
+# square numbers, so their nearest blocker is the lowest set bit; the last four
+# run towards lower square numbers and use the highest set bit.
+NORTH, EAST, NORTH_EAST, NORTH_WEST, SOUTH, WEST, SOUTH_WEST, SOUTH_EAST = range(8)
+DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1), (-1, 0), (0, -1), (-1, -1), (-1, 1)]
+ROOK_DIRECTIONS = (NORTH, EAST, SOUTH, WEST)
+BISHOP_DIRECTIONS = (NORTH_EAST, NORTH_WEST, SOUTH_WEST, SOUTH_EAST)
+
+
+def _rays():
+    rays = []
+    for dRank, dFile in DIRECTIONS:
+        table = []
+        for sq in range(64):
+            rank, file = divmod(sq, 8)
+            ray = 0
+            rank, file = rank + dRank, file + dFile
+            while 0 <= rank < 8 and 0 <= file < 8:
+                ray |= 1 << (rank * 8 + file)
+                rank, file = rank + dRank, file + dFile
+            table.append(ray)
+        rays.append(table)
+    return rays
+
+
+RAYS = _rays()
+
+
+def _rayAttacks(sq, occupied, direction):
+    ray = RAYS[direction][sq]
+    blockers = ray & occupied
+    if blockers:
+        if direction < SOUTH:
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        ray ^= RAYS[direction][blocker]
+    return ray
+
+
+def rookAttacks(sq, occupied):
+    return (
+        _rayAttacks(sq, occupied, NORTH)
+        | _rayAttacks(sq, occupied, EAST)
+        | _rayAttacks(sq, occupied, SOUTH)
+        | _rayAttacks(sq, occupied, WEST)
+    )
+
+
+def bishopAttacks(sq, occupied):
+    return (
+        _rayAttacks(sq, occupied, NORTH_EAST)
+        | _rayAttacks(sq, occupied, NORTH_WEST)
+        | _rayAttacks(sq, occupied, SOUTH_WEST)
+        | _rayAttacks(sq, occupied, SOUTH_EAST)
+    )
+
+
+def queenAttacks(sq, occupied):
+    return rookAttacks(sq, occupied) | bishopAttacks(sq, occupied)
+
+
+# empty-board attacks, used to find sliders lined up with a square
+ROOK_RAYS = [rookAttacks(sq, 0) for sq in range(64)]
+BISHOP_RAYS = [bishopAttacks(sq, 0) for sq in range(64)]
+
+
+def _betweenAndLine():
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for direction in range(8):
+        opposite = (direction + 4) % 8
+        for a in range(64):
+            full = RAYS[direction][a] | RAYS[opposite][a] | (1 << a)
+            for b in squaresOf(RAYS[direction][a]):
+                between[a][b] = RAYS[direction][a] & ~RAYS[direction][b] & ~(1 << b)
+                line[a][b] = full
+    return between, line
+
+
+# BETWEEN[a][b]: squares strictly between two aligned squares (0 if not aligned)
+# LINE[a][b]: the whole rank, file or diagonal through both (0 if not aligned)
+BETWEEN, LINE = _betweenAndLine()
+
+
+def printBitboard(bitboard):
+    for rank in range(7, -1, -1):
+        for file in range(0, 8):
+            square = rank * 8 + file
+            if bitboard & (1 << square):
+                print('1', end=' ')
+            else:
+                print('0', end=' ')
+        print()
@@ -1,5 +1,51 @@
+import random
+from array import array
+
+from ChessBitboard import (
+    BETWEEN,
+    BISHOP_RAYS,
+    FILE_A,
+    FILE_H,
+    FULL,
+    KING_ATTACKS,
+    KNIGHT_ATTACKS,
+    LINE,
+    PAWN_ATTACKS,
+    PIECE_NAMES,
+    RANK_1,
+    RANK_8,
+    ROOK_RAYS,
+    ROW_COL_TO_SQUARE,
+    SQUARE_TO_ROW_COL,
+    bishopAttacks,
+    queenAttacks,
+    rookAttacks,
+)
+from PieceScores import pieceScore, piecePositionScores
+
 PIECES = {"bP", "bR", "bQ", "wP", "wR", "wQ"}
 
+LINE_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_DIRECTIONS = ((-1, -2), (-1, 2), (1, -2), (1, 2), (-2, -1), (-2, 1), (2, -1), (2, 1))
+
+# Zobrist keys, indexed like the bitboards (a1 = 0). The seed is fixed so keys are
+# the same in every process and can be stored in files.
+_zobristRandom = random.Random(20240229)
+ZOBRIST_PIECES = {piece: [_zobristRandom.getrandbits(64) for _ in range(64)] for piece in PIECE_NAMES}
+ZOBRIST_CASTLING = [_zobristRandom.getrandbits(64) for _ in range(4)]  # wks, bks, wqs, bqs
+ZOBRIST_ENPASSANT = [_zobristRandom.getrandbits(64) for _ in range(8)]  # by file
+ZOBRIST_BLACK_TO_MOVE = _zobristRandom.getrandbits(64)
+# check the incremental key against a full recomputation after every make/undo
+ZOBRIST_DEBUG = False
+
+# positional score of every piece on every square, kings score 0
+PIECE_POSITION_SCORES = {
+    piece: [[0] * 8 for _ in range(8)] if piece[1] == "K"
+    else piecePositionScores[piece] if piece[1] == "P"
+    else piecePositionScores[piece[1]]
+    for piece in PIECE_NAMES
+}
+
 
 class GameState:
     def __init__(self):
@@ -25,14 +71,22 @@ class GameState:
 
         self.whiteToMove = True
         self.moveLog = []
+        self.startPly = 0 # plies played before moveLog, for the FEN move number
         self.whiteKingLocation = (7, 4)
         self.blackKingLocation = (0, 4)
         self.checkMate = False
         self.staleMate = False
         self.draw = False
 
-        
         self.enpassantPossible = ()
+        self.enpassantPossibleLog = [self.enpassantPossible]
+        self.halfmoveClock = 0 # plies since the last capture or pawn move
+        self.halfmoveClockLog = [self.halfmoveClock]
+
+        self.inCheck = False
+        self.pins = {}
+        self.checks = []
+        self.capturesOnly = False
 
         
         self.currentCastlingRight = CastleRights(True, True, True, True)
@@ -45,6 +99,190 @@ class GameState:
             )
         ]
 
+        self.zobristKey = self.computeZobristKey()
+        self.zobristHistory = [self.zobristKey] # key of every position of the game, for repetitions
+        self.computeScores()
+
+    def loadFen(self, fen):
+        # Sets up the position from a FEN string. The halfmove clock and move
+        # number fields are optional.
+        fields = fen.split()
+        rows = fields[0].split("/") if fields else []
+        if len(rows) != 8 or len(fields) < 2 or fields[1] not in ("w", "b"):
+            raise ValueError("invalid FEN: " + fen)
+        board = []
+        for row in rows:
+            boardRow = []
+            for char in row:
+                if char.isdigit():
+                    boardRow.extend(["--"] * int(char))
+                elif char.upper() in "PRNBQK":
+                    boardRow.append(("w" if char.isupper() else "b") + char.upper())
+                else:
+                    raise ValueError("invalid FEN: " + fen)
+            if len(boardRow) != 8:
+                raise ValueError("invalid FEN: " + fen)
+            board.append(boardRow)
+        kings = [(board[r][c], (r, c)) for r in range(8) for c in range(8) if board[r][c][1] == "K"]
+        if sorted(piece for piece, _ in kings) != ["bK", "wK"]:
+            raise ValueError("invalid FEN, each side needs one king: " + fen)
+        if "P" in (piece[1] for piece in board[0] + board[7]):
+            raise ValueError("invalid FEN, pawn on the first or last rank: " + fen)
+        kings = dict(kings)
+
+        self.board = board
+        self.whiteToMove = fields[1] == "w"
+        self.whiteKingLocation = kings["wK"]
+        self.blackKingLocation = kings["bK"]
+        # the side that just moved cannot have left its king in check; the
+        # mailbox test, as the bitboards are not set up yet
+        waitingKing = self.blackKingLocation if self.whiteToMove else self.whiteKingLocation
+        if GameState.isAttackedBy(self, waitingKing[0], waitingKing[1], fields[1]):
+            raise ValueError("invalid FEN, the side not to move is in check: " + fen)
+        self.moveLog = []
+        self.checkMate = False
+        self.staleMate = False
+        self.draw = False
+
+        # a right is kept only while its king and rook are on their home squares
+        rights = fields[2] if len(fields) > 2 else "-"
+        rights = [
+            right in rights and board[row][4] == color + "K" and board[row][rookCol] == color + "R"
+            for right, color, row, rookCol in (("K", "w", 7, 7), ("k", "b", 0, 7), ("Q", "w", 7, 0), ("q", "b", 0, 0))
+        ]
+        self.currentCastlingRight = CastleRights(*rights)
+        self.castleRightsLog = [CastleRights(*rights)]
+
+        enpassant = fields[3] if len(fields) > 3 else "-"
+        if enpassant == "-":
+            self.enpassantPossible = ()
+        elif len(enpassant) == 2 and enpassant[0] in Move.filesToCols and enpassant[1] in ("3", "6"):
+            self.enpassantPossible = (Move.ranksToRows[enpassant[1]], Move.filesToCols[enpassant[0]])
+        else:
+            raise ValueError("invalid FEN: " + fen)
+        self.enpassantPossibleLog = [self.enpassantPossible]
+
+        halfmoveClock = fields[4] if len(fields) > 4 else "0"
+        moveNumber = fields[5] if len(fields) > 5 else "1"
+        if not halfmoveClock.isdigit() or not moveNumber.isdigit():
+            raise ValueError("invalid FEN: " + fen)
+        self.halfmoveClock = int(halfmoveClock)
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.startPly = 2 * max(int(moveNumber) - 1, 0) + (0 if self.whiteToMove else 1)
+
+        self.zobristKey = self.computeZobristKey()
+        self.zobristHistory = [self.zobristKey]
+        self.computeScores()
+
+    def getFen(self):
+        rows = []
+        for row in self.board:
+            text = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                text += piece[1] if piece[0] == "w" else piece[1].lower()
+            rows.append(text + (str(empty) if empty else ""))
+        rights = self.currentCastlingRight
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + ("k" if rights.bks else "") + ("q" if rights.bqs else "")
+        if self.enpassantPossible:
+            enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        else:
+            enpassant = "-"
+        moveNumber = (self.startPly + len(self.moveLog)) // 2 + 1
+        return "%s %s %s %s %d %d" % (
+            "/".join(rows), "w" if self.whiteToMove else "b", castling or "-", enpassant, self.halfmoveClock, moveNumber
+        )
+
+    def computeScores(self):
+        # material in pawns and positional score per side, kept up to date by
+        # updateScores so the AI can read them instead of scanning the board
+        self.materialScore = {"w": 0, "b": 0}
+        self.positionScore = {"w": 0, "b": 0}
+        self.pieceCounts = {piece: 0 for piece in PIECE_NAMES}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    self.pieceCounts[piece] += 1
+                    self.materialScore[piece[0]] += pieceScore[piece[1]]
+                    self.positionScore[piece[0]] += PIECE_POSITION_SCORES[piece][r][c]
+
+    def updateScores(self, move, sign):
+        # sign is 1 when making the move and -1 when taking it back
+        color = move.pieceMoved[0]
+        placed = color + "Q" if move.isPawnPromotion else move.pieceMoved
+        if move.isPawnPromotion:
+            self.materialScore[color] += sign * (pieceScore["Q"] - pieceScore["P"])
+            self.pieceCounts[move.pieceMoved] -= sign
+            self.pieceCounts[placed] += sign
+        self.positionScore[color] += sign * (
+            PIECE_POSITION_SCORES[placed][move.endRow][move.endCol]
+            - PIECE_POSITION_SCORES[move.pieceMoved][move.startRow][move.startCol]
+        )
+        if move.pieceCaptured != "--":
+            enemy = move.pieceCaptured[0]
+            capturedRow = move.startRow if move.isEnpassantMove else move.endRow
+            self.materialScore[enemy] -= sign * pieceScore[move.pieceCaptured[1]]
+            self.pieceCounts[move.pieceCaptured] -= sign
+            self.positionScore[enemy] -= sign * PIECE_POSITION_SCORES[move.pieceCaptured][capturedRow][move.endCol]
+        if move.isCastleMove:
+            rookScores = PIECE_POSITION_SCORES[color + "R"][move.endRow]
+            if move.endCol - move.startCol == 2:
+                self.positionScore[color] += sign * (rookScores[move.endCol - 1] - rookScores[move.endCol + 1])
+            else:
+                self.positionScore[color] += sign * (rookScores[move.endCol + 1] - rookScores[move.endCol - 2])
+
+    def computeZobristKey(self):
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][ROW_COL_TO_SQUARE[r][c]]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= castlingZobrist(self.currentCastlingRight)
+        if self.enpassantPossible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        return key
+
+    def zobristDelta(self, move, oldRights, newRights, oldEnpassant, newEnpassant):
+        # XOR of every key that changes when move is made; undoing applies it again
+        color = move.pieceMoved[0]
+        toSquare = ROW_COL_TO_SQUARE[move.endRow][move.endCol]
+        placed = color + "Q" if move.isPawnPromotion else move.pieceMoved
+        delta = (
+            ZOBRIST_BLACK_TO_MOVE
+            ^ ZOBRIST_PIECES[move.pieceMoved][ROW_COL_TO_SQUARE[move.startRow][move.startCol]]
+            ^ ZOBRIST_PIECES[placed][toSquare]
+        )
+        if move.isEnpassantMove:
+            delta ^= ZOBRIST_PIECES[move.pieceCaptured][ROW_COL_TO_SQUARE[move.startRow][move.endCol]]
+        elif move.pieceCaptured != "--":
+            delta ^= ZOBRIST_PIECES[move.pieceCaptured][toSquare]
+        if move.isCastleMove:
+            rookKeys = ZOBRIST_PIECES[color + "R"]
+            if move.endCol - move.startCol == 2:
+                delta ^= rookKeys[toSquare + 1] ^ rookKeys[toSquare - 1]
+            else:
+                delta ^= rookKeys[toSquare - 2] ^ rookKeys[toSquare + 1]
+        delta ^= castlingZobrist(oldRights) ^ castlingZobrist(newRights)
+        if oldEnpassant != ():
+            delta ^= ZOBRIST_ENPASSANT[oldEnpassant[1]]
+        if newEnpassant != ():
+            delta ^= ZOBRIST_ENPASSANT[newEnpassant[1]]
+        return delta
+
+    def checkZobristKey(self):
+        if self.zobristKey != self.computeZobristKey():
+            raise AssertionError("incremental Zobrist key does not match the position")
+
     def getAllPossibleMoves(self):
         moves = []
 
@@ -62,69 +300,279 @@ class GameState:
 
 
     def getValidMoves(self):
-        tempEnpassantPossible = self.enpassantPossible
-        tempCastleRights = CastleRights(
-            self.currentCastlingRight.wks,
-            self.currentCastlingRight.bks,
-            self.currentCastlingRight.wqs,
-            self.currentCastlingRight.bqs,
-        )
-    
-        moves = self.getAllPossibleMoves()
-
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
         if self.whiteToMove:
-            self.getCastleMoves(
-                self.whiteKingLocation[0], self.whiteKingLocation[1], moves
-            )
+            kingRow, kingCol = self.whiteKingLocation
         else:
-            self.getCastleMoves(
-                self.blackKingLocation[0], self.blackKingLocation[1], moves
-            )
+            kingRow, kingCol = self.blackKingLocation
+        attacked = self.getAttackedSquares("b" if self.whiteToMove else "w")
 
-        for i in range(len(moves) - 1, -1, -1):
-            self.makeMove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            if self.incheck():
-                moves.remove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+        if self.inCheck and len(self.checks) > 1:
+            # double check, only the king can move
+            moves = []
+            self.getKingMoves(kingRow, kingCol, moves)
+        else:
+            moves = self.getAllPossibleMoves()
+            if self.inCheck:
+                checkRow, checkCol, dr, dc = self.checks[0]
+                validSquares = [(checkRow, checkCol)]
+                if self.board[checkRow][checkCol][1] != "N":
+                    for i in range(1, 8):
+                        square = (kingRow + dr * i, kingCol + dc * i)
+                        if square == (checkRow, checkCol):
+                            break
+                        validSquares.append(square)
+                moves = [
+                    move
+                    for move in moves
+                    if move.pieceMoved[1] == "K"
+                    or move.isEnpassantMove
+                    or (move.endRow, move.endCol) in validSquares
+                ]
+            else:
+                self.getCastleMoves(kingRow, kingCol, moves, attacked)
+
+        moves = [
+            move
+            for move in moves
+            if (move.pieceMoved[1] != "K" or not attacked >> ROW_COL_TO_SQUARE[move.endRow][move.endCol] & 1)
+            and (not move.isEnpassantMove or self.enpassantIsSafe(move))
+        ]
+        self.pins = {}
 
         if len(moves) == 0:
-            if self.incheck():
+            if self.inCheck:
                 self.checkMate = True
             else:
                 self.staleMate = True
-    
-        
-        piece_counts = { "wP": 0, "wR": 0, "wN": 0, "wB": 0, "wQ": 0, "wK": 0, "bP": 0, "bR": 0, "bN": 0, "bB": 0, "bQ": 0, "bK": 0,}
 
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                if self.board[r][c] != "--":
-                    piece_counts[self.board[r][c]] += 1
+        self.updateDrawState()
+        return moves
+
+    def getCaptureMoves(self):
+        # legal captures and promotions only, for the quiescence search
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.inCheck:
+            return [move for move in self.getValidMoves() if move.isCapture or move.isPawnPromotion]
+
+        self.capturesOnly = True
+        moves = self.getAllPossibleMoves()
+        self.capturesOnly = False
+        enemyColor = "b" if self.whiteToMove else "w"
+        # not in check, so the king cannot be shielding the square it captures on
+        moves = [
+            move
+            for move in moves
+            if (move.pieceMoved[1] != "K" or not self.isAttackedBy(move.endRow, move.endCol, enemyColor))
+            and (not move.isEnpassantMove or self.enpassantIsSafe(move))
+        ]
+        self.pins = {}
+        return moves
+
+    def getQuietMoves(self):
+        # legal moves that neither capture nor promote, the rest of getValidMoves
+        # after getCaptureMoves; the game-over flags are left as they were
+        flags = self.checkMate, self.staleMate, self.draw
+        moves = [move for move in self.getValidMoves() if not move.isCapture and not move.isPawnPromotion]
+        self.checkMate, self.staleMate, self.draw = flags
+        return moves
 
-        if sum(piece_counts.values()) == 2:
+    def checkForPinsAndChecks(self, kingRow=None, kingCol=None):
+        # Looks outward from the king along every line. An ally piece followed by an
+        # enemy slider on the same line is pinned; an enemy attacker with nothing in
+        # between gives check.
+        pins = {}
+        checks = []
+        inCheck = False
+        if self.whiteToMove:
+            enemyColor, allyColor = "b", "w"
+            pawnDirection = -1
+            if kingRow is None:
+                kingRow, kingCol = self.whiteKingLocation
+        else:
+            enemyColor, allyColor = "w", "b"
+            pawnDirection = 1
+            if kingRow is None:
+                kingRow, kingCol = self.blackKingLocation
+
+        for dr, dc in LINE_DIRECTIONS:
+            possiblePin = ()
+            for i in range(1, 8):
+                endRow = kingRow + dr * i
+                endCol = kingCol + dc * i
+                if not (0 <= endRow < 8 and 0 <= endCol < 8):
+                    break
+                endPiece = self.board[endRow][endCol]
+                if endPiece[0] == allyColor and endPiece[1] != "K":
+                    if possiblePin == ():
+                        possiblePin = (endRow, endCol)
+                    else:
+                        break
+                elif endPiece[0] == enemyColor:
+                    pieceType = endPiece[1]
+                    diagonal = dr != 0 and dc != 0
+                    if (
+                        pieceType == "Q"
+                        or (pieceType == "R" and not diagonal)
+                        or (pieceType == "B" and diagonal)
+                        or (i == 1 and pieceType == "K")
+                        or (i == 1 and pieceType == "P" and diagonal and dr == pawnDirection)
+                    ):
+                        if possiblePin == ():
+                            inCheck = True
+                            checks.append((endRow, endCol, dr, dc))
+                        else:
+                            pins[possiblePin] = (dr, dc)
+                    break
+
+        for dr, dc in KNIGHT_DIRECTIONS:
+            endRow = kingRow + dr
+            endCol = kingCol + dc
+            if 0 <= endRow < 8 and 0 <= endCol < 8 and self.board[endRow][endCol] == enemyColor + "N":
+                inCheck = True
+                checks.append((endRow, endCol, dr, dc))
+
+        return inCheck, pins, checks
+
+    def enpassantIsSafe(self, move):
+        # the two pawns leave the same rank at once, so probe the board with both gone
+        board = self.board
+        capturedPawn = board[move.startRow][move.endCol]
+        board[move.startRow][move.startCol] = "--"
+        board[move.startRow][move.endCol] = "--"
+        board[move.endRow][move.endCol] = move.pieceMoved
+        safe = not self.checkForPinsAndChecks()[0]
+        board[move.startRow][move.startCol] = move.pieceMoved
+        board[move.startRow][move.endCol] = capturedPawn
+        board[move.endRow][move.endCol] = "--"
+        return safe
+
+    def updateDrawState(self):
+        # Insufficient material, the fifty-move rule or threefold repetition.
+        # The flag is worked out again on every call, so it clears when the
+        # move that drew is taken back.
+        piece_counts = self.pieceCounts
+        pieces = sum(piece_counts.values())
+
+        if pieces == 2:
             self.draw = True
-        elif (sum(piece_counts.values()) == 3) and (
+        elif pieces == 3 and (
             piece_counts["bB"] == 1
             or piece_counts["bN"] == 1
             or piece_counts["wB"] == 1
             or piece_counts["wN"] == 1
         ):
             self.draw = True
-        elif sum(piece_counts.values()) == 4 and (
+        elif pieces == 4 and (
             (piece_counts["bB"] == 1 and piece_counts["wN"] == 1)
             or (piece_counts["wB"] == 1 and piece_counts["bN"] == 1)
             or (piece_counts["bN"] == 2)
             or (piece_counts["wN"] == 2)
         ):
             self.draw = True
+        else:
+            self.draw = (self.halfmoveClock >= 100 and not self.checkMate) or self.isRepetition(2)
+
+    def isRepetition(self, times=1):
+        # True when the position has been on the board `times` times before.
+        # Only positions since the last capture or pawn move can repeat, and
+        # only every other one has the same side to move.
+        history = self.zobristHistory
+        last = len(history) - 1
+        key = history[last]
+        seen = 0
+        for index in range(last - 4, max(last - self.halfmoveClock, 0) - 1, -2):
+            if history[index] == key:
+                seen += 1
+                if seen == times:
+                    return True
+        return False
 
+    def getMoveFromUCI(self, text):
+        # the legal move written in coordinate notation, e.g. "e2e4" or "e7e8q"
+        for move in self.getValidMoves():
+            if move.getUCINotation() == text:
+                return move
+        raise ValueError("illegal move: " + text)
+
+    def getMoveFromSAN(self, text, validMoves=None):
+        # the legal move written in standard algebraic notation, e.g. "Nbd7",
+        # "exd6", "e8=Q+" or "O-O"
+        san = text.rstrip("+#!?")
+        if validMoves is None:
+            validMoves = self.getValidMoves()
+        if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            endCol = 6 if len(san) == 3 else 2
+            for move in validMoves:
+                if move.isCastleMove and move.endCol == endCol:
+                    return move
+            raise ValueError("illegal move: " + text)
+        if "=" in san:
+            san, promotion = san.split("=")
+            if promotion != "Q":
+                raise ValueError("only queen promotions are supported: " + text)
+        elif san[-1:] == "Q" and san[0] in "abcdefgh":
+            san = san[:-1]
+        piece = san[0] if san[:1] in ("K", "Q", "R", "B", "N") else "P"
+        if piece != "P":
+            san = san[1:]
+        san = san.replace("x", "").replace("-", "")
+        if len(san) < 2 or san[-2] not in Move.filesToCols or san[-1] not in Move.ranksToRows:
+            raise ValueError("invalid move: " + text)
+        endRow, endCol = Move.ranksToRows[san[-1]], Move.filesToCols[san[-2]]
+        fromFile = [Move.filesToCols[char] for char in san[:-2] if char in Move.filesToCols]
+        fromRank = [Move.ranksToRows[char] for char in san[:-2] if char in Move.ranksToRows]
+        matches = [
+            move for move in validMoves
+            if move.pieceMoved[1] == piece and move.endRow == endRow and move.endCol == endCol and not move.isCastleMove
+            and (not fromFile or move.startCol == fromFile[0]) and (not fromRank or move.startRow == fromRank[0])
+        ]
+        if len(matches) != 1:
+            raise ValueError(("ambiguous move: " if matches else "illegal move: ") + text)
+        return matches[0]
+
+    def getMoveSAN(self, move, validMoves=None):
+        # standard algebraic notation of a legal move, as getMoveFromSAN reads it
+        if validMoves is None:
+            validMoves = self.getValidMoves()
+        if move.isCastleMove:
+            san = "O-O" if move.endCol == 6 else "O-O-O"
+        elif move.pieceMoved[1] == "P":
+            san = (move.colsToFiles[move.startCol] + "x" if move.isCapture else "") + move.getRankFile(move.endRow, move.endCol)
+            if move.isPawnPromotion:
+                san += "=Q"
+        else:
+            others = [
+                other for other in validMoves
+                if other.pieceMoved == move.pieceMoved and other.endRow == move.endRow and other.endCol == move.endCol and other != move
+            ]
+            disambiguation = ""
+            if others:
+                if all(other.startCol != move.startCol for other in others):
+                    disambiguation = move.colsToFiles[move.startCol]
+                elif all(other.startRow != move.startRow for other in others):
+                    disambiguation = move.rowsToRanks[move.startRow]
+                else:
+                    disambiguation = move.getRankFile(move.startRow, move.startCol)
+            san = move.pieceMoved[1] + disambiguation + ("x" if move.isCapture else "") + move.getRankFile(move.endRow, move.endCol)
+
+        flags = self.checkMate, self.staleMate, self.draw
+        self.makeMove(move)
+        if self.incheck():
+            san += "#" if not self.getValidMoves() else "+"
+        self.undoMove()
+        self.checkMate, self.staleMate, self.draw = flags
+        return san
+
+    def getPieceCounts(self):
+        # full scan of the board, the reference for pieceCounts
+        piece_counts = { "wP": 0, "wR": 0, "wN": 0, "wB": 0, "wQ": 0, "wK": 0, "bP": 0, "bR": 0, "bN": 0, "bB": 0, "bQ": 0, "bK": 0,}
 
-        self.enpassantPossible = tempEnpassantPossible
-        self.currentCastlingRight = tempCastleRights
-        return moves
-
+        for r in range(len(self.board)):
+            for c in range(len(self.board[r])):
+                if self.board[r][c] != "--":
+                    piece_counts[self.board[r][c]] += 1
+        return piece_counts
 
     def incheck(self):
         if self.whiteToMove:
@@ -138,14 +586,78 @@ class GameState:
 
 
     def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:
+        return self.isAttackedBy(r, c, "b" if self.whiteToMove else "w")
+
+    def isAttackedBy(self, r, c, color):
+        # look outward from the square and stop at the first piece on each line
+        board = self.board
+        for dr, dc in LINE_DIRECTIONS:
+            diagonal = dr != 0 and dc != 0
+            for i in range(1, 8):
+                endRow = r + dr * i
+                endCol = c + dc * i
+                if not (0 <= endRow < 8 and 0 <= endCol < 8):
+                    break
+                endPiece = board[endRow][endCol]
+                if endPiece == "--":
+                    continue
+                if endPiece[0] == color:
+                    pieceType = endPiece[1]
+                    if (
+                        pieceType == "Q"
+                        or (pieceType == "R" and not diagonal)
+                        or (pieceType == "B" and diagonal)
+                        or (i == 1 and pieceType == "K")
+                        or (i == 1 and pieceType == "P" and diagonal and dr == (1 if color == "w" else -1))
+                    ):
+                        return True
+                break
+
+        for dr, dc in KNIGHT_DIRECTIONS:
+            endRow = r + dr
+            endCol = c + dc
+            if 0 <= endRow < 8 and 0 <= endCol < 8 and board[endRow][endCol] == color + "N":
                 return True
         return False
 
+    def getAttackedSquares(self, color):
+        # Every square `color` attacks, as a bitboard (a1 = 0, see ChessBitboard).
+        # The other king is see-through, so squares it would step back into along
+        # a checking line count as attacked.
+        attacked = 0
+        board = self.board
+        enemyKing = ("b" if color == "w" else "w") + "K"
+        pawnDirection = -1 if color == "w" else 1
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != color:
+                    continue
+                pieceType = piece[1]
+                if pieceType == "P":
+                    directions, reach = ((pawnDirection, -1), (pawnDirection, 1)), 1
+                elif pieceType == "N":
+                    directions, reach = KNIGHT_DIRECTIONS, 1
+                elif pieceType == "K":
+                    directions, reach = LINE_DIRECTIONS, 1
+                elif pieceType == "R":
+                    directions, reach = LINE_DIRECTIONS[:4], 7
+                elif pieceType == "B":
+                    directions, reach = LINE_DIRECTIONS[4:], 7
+                else:
+                    directions, reach = LINE_DIRECTIONS, 7
+                for dr, dc in directions:
+                    for i in range(1, reach + 1):
+                        endRow = r + dr * i
+                        endCol = c + dc * i
+                        if not (0 <= endRow < 8 and 0 <= endCol < 8):
+                            break
+                        attacked |= 1 << ROW_COL_TO_SQUARE[endRow][endCol]
+                        endPiece = board[endRow][endCol]
+                        if endPiece != "--" and endPiece != enemyKing:
+                            break
+        return attacked
+
     def makeMove(self, move):
         self.board[move.startRow][move.startCol] = "--"
         self.board[move.endRow][move.endCol] = move.pieceMoved
@@ -169,6 +681,7 @@ class GameState:
             self.enpassantPossible = ((move.startRow + move.endRow) // 2, move.startCol)
         else:
             self.enpassantPossible = ()
+        self.enpassantPossibleLog.append(self.enpassantPossible)
 
         if move.isCastleMove:
             if move.endCol - move.startCol == 2:
@@ -192,10 +705,35 @@ class GameState:
             )
         )
 
+        self.zobristKey ^= self.zobristDelta(
+            move,
+            self.castleRightsLog[-2],
+            self.castleRightsLog[-1],
+            self.enpassantPossibleLog[-2],
+            self.enpassantPossibleLog[-1],
+        )
+        self.zobristHistory.append(self.zobristKey)
+        self.halfmoveClock = 0 if move.pieceMoved[1] == "P" or move.pieceCaptured != "--" else self.halfmoveClock + 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        self.updateScores(move, 1)
+        if ZOBRIST_DEBUG:
+            self.checkZobristKey()
+
 
     def undoMove(self):
         if len(self.moveLog) != 0:
+            self.zobristKey ^= self.zobristDelta(
+                self.moveLog[-1],
+                self.castleRightsLog[-2],
+                self.castleRightsLog[-1],
+                self.enpassantPossibleLog[-2],
+                self.enpassantPossibleLog[-1],
+            )
             move = self.moveLog.pop()
+            self.zobristHistory.pop()
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1]
+            self.updateScores(move, -1)
             self.board[move.startRow][move.startCol] = move.pieceMoved
             self.board[move.endRow][move.endCol] = move.pieceCaptured
 
@@ -209,10 +747,9 @@ class GameState:
             if move.isEnpassantMove:
                 self.board[move.endRow][move.endCol] = "--"
                 self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enpassantPossible = (move.endRow, move.endCol)
 
-            if move.pieceMoved[1] == "P" and abs(move.startRow - move.endRow) == 2:
-                self.enpassantPossible = ()
+            self.enpassantPossibleLog.pop()
+            self.enpassantPossible = self.enpassantPossibleLog[-1]
 
             self.castleRightsLog.pop()  # get rid of the new castle rights from the move we are undoing
             newRights = self.castleRightsLog[-1]
@@ -235,13 +772,23 @@ class GameState:
             self.checkMate = False
             self.staleMate = False
 
+            if ZOBRIST_DEBUG:
+                self.checkZobristKey()
+
+    def pinAllows(self, r, c, dr, dc):
+        pin = self.pins.get((r, c))
+        return pin is None or pin == (dr, dc) or pin == (-dr, -dc)
+
     def getMovesInDirections(self, r, c, moves, directions):
         for dr, dc in directions:
+            if not self.pinAllows(r, c, dr, dc):
+                continue
             new_r, new_c = r + dr, c + dc
             while 0 <= new_r < 8 and 0 <= new_c < 8:
                 new_pos = self.board[new_r][new_c]
                 if new_pos == "--" or new_pos[0] != self.board[r][c][0]:
-                    moves.append(Move((r, c), (new_r, new_c), self.board))
+                    if new_pos != "--" or not self.capturesOnly:
+                        moves.append(Move((r, c), (new_r, new_c), self.board))
                     if new_pos != "--" and new_pos[0] != self.board[r][c][0]:
                         break
                     new_r += dr
@@ -256,13 +803,18 @@ class GameState:
                 0 <= new_r < 8
                 and 0 <= new_c < 8
                 and self.board[new_r][new_c][0] != self.board[r][c][0]
+                and (self.board[new_r][new_c] != "--" or not self.capturesOnly)
             ):
                 moves.append(Move((r, c), (new_r, new_c), self.board))
 
     def getPawnMoves(self, r, c, moves):
         whiteTurn = self.whiteToMove
         direction = -1 if whiteTurn else 1
-        if self.board[r + direction][c] == "--":
+        if (
+            self.board[r + direction][c] == "--"
+            and self.pinAllows(r, c, direction, 0)
+            and (not self.capturesOnly or r + direction in (0, 7))
+        ):
             moves.append(Move((r, c), (r + direction, c), self.board))
             if ((r == 6 and whiteTurn) or (r == 1 and not whiteTurn)) and self.board[
                 r + 2 * direction
@@ -271,7 +823,7 @@ class GameState:
 
         for dc in [-1, 1]:
             new_c = c + dc
-            if 0 <= new_c < 8:
+            if 0 <= new_c < 8 and self.pinAllows(r, c, direction, dc):
                 target_piece = self.board[r + direction][new_c]
                 if target_piece != "--" and target_piece[0] != self.board[r][c][0]:
                     moves.append(Move((r, c), (r + direction, new_c), self.board))
@@ -300,17 +852,9 @@ class GameState:
 
 
     def getKnightMoves(self, r, c, moves):
-        directions = [
-            (-1, -2),
-            (-1, 2),
-            (1, -2),
-            (1, 2),
-            (-2, -1),
-            (-2, 1),
-            (2, -1),
-            (2, 1),
-        ]
-        self.getOneMoveInDirections(r, c, moves, directions)
+        if (r, c) in self.pins:
+            return
+        self.getOneMoveInDirections(r, c, moves, KNIGHT_DIRECTIONS)
 
     def getKingMoves(self, r, c, moves):
         directions = [
@@ -325,41 +869,44 @@ class GameState:
         ]
         self.getOneMoveInDirections(r, c, moves, directions)
 
-    def getCastleMoves(self, r, c, moves):
-        direction = -1 if self.whiteToMove else 1
-        if self.squareUnderAttack(r, c) or (self.board[r + direction][c][1] == "P"):
+    def getCastleMoves(self, r, c, moves, attacked=None):
+        if self.whiteToMove:
+            hasRights = self.currentCastlingRight.wks or self.currentCastlingRight.wqs
+        else:
+            hasRights = self.currentCastlingRight.bks or self.currentCastlingRight.bqs
+        if not hasRights:
+            return
+        if attacked is None:
+            attacked = self.getAttackedSquares("b" if self.whiteToMove else "w")
+        if attacked >> ROW_COL_TO_SQUARE[r][c] & 1:
             return
         if (self.whiteToMove and self.currentCastlingRight.wks) or (
             not self.whiteToMove and self.currentCastlingRight.bks
         ):
-            self.getKingSideCastleMoves(r, c, moves)
+            self.getKingSideCastleMoves(r, c, moves, attacked)
         if (self.whiteToMove and self.currentCastlingRight.wqs) or (
             not self.whiteToMove and self.currentCastlingRight.bqs
         ):
-            self.getQueenSideCastleMoves(r, c, moves)
+            self.getQueenSideCastleMoves(r, c, moves, attacked)
 
-    def getKingSideCastleMoves(self, r, c, moves):
+    def getKingSideCastleMoves(self, r, c, moves, attacked):
         if (
             self.board[r][c + 1] == "--"
             and self.board[r][c + 2] == "--"
             and self.board[r][c + 3][1] == "R"
         ):
-            if not self.squareUnderAttack(r, c + 1) and not self.squareUnderAttack(
-                r, c + 2
-            ):
+            if not attacked >> ROW_COL_TO_SQUARE[r][c + 1] & 1 and not attacked >> ROW_COL_TO_SQUARE[r][c + 2] & 1:
                 moves.append(Move((r, c), (r, c + 2), self.board, isCastleMove=True))
 
 
-    def getQueenSideCastleMoves(self, r, c, moves):
+    def getQueenSideCastleMoves(self, r, c, moves, attacked):
         if (
             self.board[r][c - 1] == "--"
             and self.board[r][c - 2] == "--"
             and self.board[r][c - 3] == "--"
             and self.board[r][c - 4][1] == "R"
         ):
-            if not self.squareUnderAttack(r, c - 1) and not self.squareUnderAttack(
-                r, c - 2
-            ):
+            if not attacked >> ROW_COL_TO_SQUARE[r][c - 1] & 1 and not attacked >> ROW_COL_TO_SQUARE[r][c - 2] & 1:
                 moves.append(Move((r, c), (r, c - 2), self.board, isCastleMove=True))
 
     def updateCastleRights(self, move):
@@ -396,6 +943,376 @@ class GameState:
                     self.currentCastlingRight.bks = False
 
 
+class BitboardGameState(GameState):
+    # Keeps one bitboard per piece type and colour next to the board list. The board,
+    # king locations, castle rights and logs are still maintained by GameState so the
+    # GUI and AI read them as before; movegen and attack detection use the bitboards.
+
+    def __init__(self):
+        super().__init__()
+        self.syncBitboards()
+
+    def loadFen(self, fen):
+        super().loadFen(fen)
+        self.syncBitboards()
+
+    def syncBitboards(self):
+        self.bitboards = {piece: 0 for piece in PIECE_NAMES}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    self.bitboards[piece] |= 1 << ROW_COL_TO_SQUARE[r][c]
+        self.occupancy = {"w": 0, "b": 0}
+        for piece in PIECE_NAMES:
+            self.occupancy[piece[0]] |= self.bitboards[piece]
+        self.occupied = self.occupancy["w"] | self.occupancy["b"]
+
+    def toggleMove(self, move):
+        # XOR the move into the bitboards; applying it twice restores the position
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        color = move.pieceMoved[0]
+        enemy = "b" if color == "w" else "w"
+        fromBit = 1 << ((move.moveID >> 6) & 63)
+        toBit = 1 << (move.moveID & 63)
+
+        bitboards[move.pieceMoved] ^= fromBit
+        placed = color + "Q" if move.isPawnPromotion else move.pieceMoved
+        bitboards[placed] ^= toBit
+        occupancy[color] ^= fromBit | toBit
+
+        if move.isEnpassantMove:
+            capturedBit = 1 << ROW_COL_TO_SQUARE[move.startRow][move.endCol]
+            bitboards[move.pieceCaptured] ^= capturedBit
+            occupancy[enemy] ^= capturedBit
+        elif move.pieceCaptured != "--":
+            bitboards[move.pieceCaptured] ^= toBit
+            occupancy[enemy] ^= toBit
+
+        if move.isCastleMove:
+            if move.endCol - move.startCol == 2:
+                rookBits = (toBit << 1) | (toBit >> 1)
+            else:
+                rookBits = (toBit >> 2) | (toBit << 1)
+            bitboards[color + "R"] ^= rookBits
+            occupancy[color] ^= rookBits
+
+        self.occupied = occupancy["w"] | occupancy["b"]
+
+    def makeMove(self, move):
+        super().makeMove(move)
+        self.toggleMove(move)
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            super().undoMove()
+            self.toggleMove(move)
+
+    def attackersTo(self, sq, color, occupied):
+        bitboards = self.bitboards
+        enemy = "b" if color == "w" else "w"
+        queens = bitboards[color + "Q"]
+        return (
+            (KNIGHT_ATTACKS[sq] & bitboards[color + "N"])
+            | (KING_ATTACKS[sq] & bitboards[color + "K"])
+            | (PAWN_ATTACKS[enemy][sq] & bitboards[color + "P"])
+            | (bishopAttacks(sq, occupied) & (bitboards[color + "B"] | queens))
+            | (rookAttacks(sq, occupied) & (bitboards[color + "R"] | queens))
+        )
+
+    def squareUnderAttack(self, r, c):
+        return self.isAttackedBy(r, c, "b" if self.whiteToMove else "w")
+
+    def isAttackedBy(self, r, c, color):
+        return self.attackersTo(ROW_COL_TO_SQUARE[r][c], color, self.occupied) != 0
+
+    def getAttackedSquares(self, color):
+        # same contract as GameState.getAttackedSquares: the other king is see-through
+        bitboards = self.bitboards
+        occupied = self.occupied & ~bitboards[("b" if color == "w" else "w") + "K"]
+        pawns = bitboards[color + "P"]
+        if color == "w":
+            attacked = ((pawns & ~FILE_A) << 7) | ((pawns & ~FILE_H) << 9)
+        else:
+            attacked = ((pawns & ~FILE_H) >> 7) | ((pawns & ~FILE_A) >> 9)
+        for piece, attacks in (
+            (color + "N", None),
+            (color + "B", bishopAttacks),
+            (color + "R", rookAttacks),
+            (color + "Q", queenAttacks),
+            (color + "K", None),
+        ):
+            pieces = bitboards[piece]
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                sq = low.bit_length() - 1
+                if attacks is not None:
+                    attacked |= attacks(sq, occupied)
+                elif piece[1] == "N":
+                    attacked |= KNIGHT_ATTACKS[sq]
+                else:
+                    attacked |= KING_ATTACKS[sq]
+        return attacked & FULL
+
+    def incheck(self):
+        color = "w" if self.whiteToMove else "b"
+        king = self.bitboards[color + "K"]
+        return self.attackersTo(king.bit_length() - 1, "b" if color == "w" else "w", self.occupied) != 0
+
+    def getAllPossibleMoves(self):
+        moves = []
+        color = "w" if self.whiteToMove else "b"
+        self.addPieceMoves(moves, FULL, {}, False)
+        kingSquare = self.bitboards[color + "K"].bit_length() - 1
+        self.addTargetMoves(moves, kingSquare, KING_ATTACKS[kingSquare] & ~self.occupancy[color])
+        return moves
+
+    def getValidMoves(self):
+        moves = []
+        bitboards = self.bitboards
+        color = "w" if self.whiteToMove else "b"
+        enemy = "b" if self.whiteToMove else "w"
+        kingSquare = bitboards[color + "K"].bit_length() - 1
+
+        checkers = self.attackersTo(kingSquare, enemy, self.occupied)
+        self.inCheck = checkers != 0
+
+        # one attack map decides both king steps and castling
+        attacked = self.getAttackedSquares(enemy)
+        self.addTargetMoves(moves, kingSquare, KING_ATTACKS[kingSquare] & ~self.occupancy[color] & ~attacked)
+
+        if checkers & (checkers - 1) == 0:
+            if checkers:
+                targetMask = checkers | BETWEEN[kingSquare][checkers.bit_length() - 1]
+            else:
+                targetMask = FULL
+            self.addPieceMoves(moves, targetMask, self.getPinLines(kingSquare), True)
+            if not checkers:
+                kingRow, kingCol = SQUARE_TO_ROW_COL[kingSquare]
+                self.getCastleMoves(kingRow, kingCol, moves, attacked)
+
+        if len(moves) == 0:
+            if self.inCheck:
+                self.checkMate = True
+            else:
+                self.staleMate = True
+
+        self.updateDrawState()
+        return moves
+
+    def getCaptureMoves(self):
+        moves = []
+        bitboards = self.bitboards
+        color = "w" if self.whiteToMove else "b"
+        enemy = "b" if self.whiteToMove else "w"
+        enemies = self.occupancy[enemy]
+        king = bitboards[color + "K"]
+        kingSquare = king.bit_length() - 1
+
+        checkers = self.attackersTo(kingSquare, enemy, self.occupied)
+        self.inCheck = checkers != 0
+
+        targets = KING_ATTACKS[kingSquare] & enemies
+        while targets:
+            target = targets & -targets
+            targets ^= target
+            targetSquare = target.bit_length() - 1
+            if not self.attackersTo(targetSquare, enemy, self.occupied ^ king):
+                moves.append(Move(SQUARE_TO_ROW_COL[kingSquare], SQUARE_TO_ROW_COL[targetSquare], self.board))
+
+        if checkers & (checkers - 1) == 0:
+            if checkers:
+                checkMask = checkers | BETWEEN[kingSquare][checkers.bit_length() - 1]
+            else:
+                checkMask = FULL
+            pinLines = self.getPinLines(kingSquare)
+            self.addPieceMoves(moves, enemies & checkMask, pinLines, True)
+
+            # pawn pushes onto the last rank
+            pawns = bitboards[color + "P"]
+            if self.whiteToMove:
+                promotions = ((pawns << 8) & ~self.occupied & RANK_8 & checkMask, 8)
+            else:
+                promotions = ((pawns >> 8) & ~self.occupied & RANK_1 & checkMask, -8)
+            targets, shift = promotions
+            while targets:
+                target = targets & -targets
+                targets ^= target
+                sq = target.bit_length() - 1
+                line = pinLines.get(sq - shift)
+                if line is None or line & target:
+                    moves.append(Move(SQUARE_TO_ROW_COL[sq - shift], SQUARE_TO_ROW_COL[sq], self.board))
+
+        return moves
+
+    def getQuietMoves(self):
+        moves = []
+        bitboards = self.bitboards
+        color = "w" if self.whiteToMove else "b"
+        enemy = "b" if self.whiteToMove else "w"
+        empty = ~self.occupied
+        king = bitboards[color + "K"]
+        kingSquare = king.bit_length() - 1
+
+        checkers = self.attackersTo(kingSquare, enemy, self.occupied)
+        self.inCheck = checkers != 0
+
+        targets = KING_ATTACKS[kingSquare] & empty
+        while targets:
+            target = targets & -targets
+            targets ^= target
+            targetSquare = target.bit_length() - 1
+            if not self.attackersTo(targetSquare, enemy, self.occupied ^ king):
+                moves.append(Move(SQUARE_TO_ROW_COL[kingSquare], SQUARE_TO_ROW_COL[targetSquare], self.board))
+
+        if checkers & (checkers - 1) == 0:
+            if checkers:
+                checkMask = BETWEEN[kingSquare][checkers.bit_length() - 1]
+            else:
+                checkMask = FULL
+            pieceMoves = []
+            self.addPieceMoves(pieceMoves, empty & checkMask, self.getPinLines(kingSquare), True, False)
+            moves.extend(move for move in pieceMoves if not move.isPawnPromotion)
+            if not checkers:
+                kingRow, kingCol = SQUARE_TO_ROW_COL[kingSquare]
+                self.getCastleMoves(kingRow, kingCol, moves)
+
+        return moves
+
+    def getPinLines(self, kingSquare):
+        # maps each pinned piece to the line it may still move along
+        bitboards = self.bitboards
+        color = "w" if self.whiteToMove else "b"
+        enemy = "b" if self.whiteToMove else "w"
+        occupied = self.occupied
+        own = self.occupancy[color]
+        queens = bitboards[enemy + "Q"]
+        snipers = (ROOK_RAYS[kingSquare] & (bitboards[enemy + "R"] | queens)) | (
+            BISHOP_RAYS[kingSquare] & (bitboards[enemy + "B"] | queens)
+        )
+        pinLines = {}
+        while snipers:
+            sniper = snipers & -snipers
+            snipers ^= sniper
+            sniperSquare = sniper.bit_length() - 1
+            between = BETWEEN[kingSquare][sniperSquare] & occupied
+            if between and between & (between - 1) == 0 and between & own:
+                pinLines[between.bit_length() - 1] = LINE[kingSquare][sniperSquare]
+        return pinLines
+
+    def addPieceMoves(self, moves, targetMask, pinLines, legal, enpassant=True):
+        # all non-king moves landing in targetMask, pinned pieces kept on their pin line
+        bitboards = self.bitboards
+        color = "w" if self.whiteToMove else "b"
+        enemy = "b" if self.whiteToMove else "w"
+        occupied = self.occupied
+        own = self.occupancy[color]
+        pinned = 0
+        for sq in pinLines:
+            pinned |= 1 << sq
+
+        pawns = bitboards[color + "P"]
+        self.addPawnMoves(moves, pawns & ~pinned, targetMask)
+        for sq, line in pinLines.items():
+            if pawns & (1 << sq):
+                self.addPawnMoves(moves, 1 << sq, targetMask & line)
+
+        if enpassant and self.enpassantPossible != ():
+            epSquare = ROW_COL_TO_SQUARE[self.enpassantPossible[0]][self.enpassantPossible[1]]
+            capturedBit = 1 << (epSquare - 8 if self.whiteToMove else epSquare + 8)
+            capturers = PAWN_ATTACKS[enemy][epSquare] & pawns
+            kingSquare = bitboards[color + "K"].bit_length() - 1
+            while capturers:
+                low = capturers & -capturers
+                capturers ^= low
+                # both pawns leave their squares at once, so test the resulting masks
+                if legal:
+                    after = (occupied ^ low ^ capturedBit) | (1 << epSquare)
+                    if self.attackersTo(kingSquare, enemy, after) & ~capturedBit:
+                        continue
+                moves.append(
+                    Move(
+                        SQUARE_TO_ROW_COL[low.bit_length() - 1],
+                        self.enpassantPossible,
+                        self.board,
+                        isEnpassantMove=True,
+                    )
+                )
+
+        for piece, attacks in (
+            (color + "N", None),
+            (color + "B", bishopAttacks),
+            (color + "R", rookAttacks),
+            (color + "Q", queenAttacks),
+        ):
+            pieces = bitboards[piece]
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                sq = low.bit_length() - 1
+                if attacks is None:
+                    if low & pinned:
+                        continue
+                    targets = KNIGHT_ATTACKS[sq] & ~own & targetMask
+                else:
+                    targets = attacks(sq, occupied) & ~own & targetMask
+                    if low & pinned:
+                        targets &= pinLines[sq]
+                self.addTargetMoves(moves, sq, targets)
+
+    def addTargetMoves(self, moves, sq, targets):
+        start = SQUARE_TO_ROW_COL[sq]
+        board = self.board
+        while targets:
+            target = targets & -targets
+            targets ^= target
+            moves.append(Move(start, SQUARE_TO_ROW_COL[target.bit_length() - 1], board))
+
+    def addPawnMoves(self, moves, pawns, targetMask):
+        enemies = self.occupancy["b" if self.whiteToMove else "w"] & targetMask
+        empty = ~self.occupied
+        if self.whiteToMove:
+            single = (pawns << 8) & empty
+            double = ((single & (RANK_1 << 16)) << 8) & empty
+            self.addShiftedMoves(moves, single & targetMask, 8)
+            self.addShiftedMoves(moves, double & targetMask, 16)
+            self.addShiftedMoves(moves, ((pawns & ~FILE_A) << 7) & enemies, 7)
+            self.addShiftedMoves(moves, ((pawns & ~FILE_H) << 9) & enemies, 9)
+        else:
+            single = (pawns >> 8) & empty
+            double = ((single & (RANK_8 >> 16)) >> 8) & empty
+            self.addShiftedMoves(moves, single & targetMask, -8)
+            self.addShiftedMoves(moves, double & targetMask, -16)
+            self.addShiftedMoves(moves, ((pawns & ~FILE_H) >> 7) & enemies, -7)
+            self.addShiftedMoves(moves, ((pawns & ~FILE_A) >> 9) & enemies, -9)
+
+    def addShiftedMoves(self, moves, targets, shift):
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            sq = low.bit_length() - 1
+            moves.append(Move(SQUARE_TO_ROW_COL[sq - shift], SQUARE_TO_ROW_COL[sq], self.board))
+
+    def getPieceCounts(self):
+        return {piece: self.bitboards[piece].bit_count() for piece in PIECE_NAMES}
+
+
+def castlingZobrist(rights):
+    key = 0
+    if rights.wks:
+        key ^= ZOBRIST_CASTLING[0]
+    if rights.bks:
+        key ^= ZOBRIST_CASTLING[1]
+    if rights.wqs:
+        key ^= ZOBRIST_CASTLING[2]
+    if rights.bqs:
+        key ^= ZOBRIST_CASTLING[3]
+    return key
+
+
 class CastleRights:
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks
@@ -404,7 +1321,27 @@ class CastleRights:
         self.bqs = bqs
 
 
+# Move codes: bits 0-15 are the moveID, to | from << 6 | promotion << 12 with
+# a1 = 0 squares and promotion 4 for a queen, the same layout Polyglot books
+# use. Above that sit the en passant, castle and capture flags and the moved
+# and captured pieces as 1 + their index in PIECE_NAMES (0 for an empty square).
+PROMOTION_QUEEN = 4
+ENPASSANT_FLAG = 1 << 16
+CASTLE_FLAG = 1 << 17
+CAPTURE_FLAG = 1 << 18
+PIECE_CODES = {piece: index + 1 for index, piece in enumerate(PIECE_NAMES)}
+PIECE_CODES["--"] = 0
+CODE_PIECES = ["--"] + PIECE_NAMES
+
+
 class Move:
+    # Moves are created for every generated move, so they use slots instead of
+    # a per-instance __dict__ and identify themselves by one small int.
+    __slots__ = (
+        "startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured",
+        "isPawnPromotion", "isEnpassantMove", "isCastleMove", "isCapture", "moveID",
+    )
+
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
     rowsToRanks = {v: k for k, v in ranksToRows.items()}
 
@@ -414,39 +1351,74 @@ class Move:
     def __init__(
         self, startSq, endSq, board, isEnpassantMove=False, isCastleMove=False
     ):
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-
-        self.isPawnPromotion = (self.pieceMoved == "wP" and self.endRow == 0) or (
-            self.pieceMoved == "bP" and self.endRow == 7
-        )
+        startRow, startCol = startSq
+        endRow, endCol = endSq
+        self.startRow = startRow
+        self.startCol = startCol
+        self.endRow = endRow
+        self.endCol = endCol
+        pieceMoved = self.pieceMoved = board[startRow][startCol]
+
+        self.isPawnPromotion = pieceMoved[1] == "P" and (endRow == 0 or endRow == 7)
 
         self.isEnpassantMove = isEnpassantMove
-        if self.isEnpassantMove:
-            self.pieceCaptured = "wP" if self.pieceMoved == "bP" else "bP"
+        if isEnpassantMove:
+            self.pieceCaptured = "wP" if pieceMoved == "bP" else "bP"
+            self.isCapture = True
+        else:
+            pieceCaptured = self.pieceCaptured = board[endRow][endCol]
+            self.isCapture = pieceCaptured != "--"
 
         self.isCastleMove = isCastleMove
 
-        self.isCapture = self.pieceCaptured != "--"
-        self.moveID = (
-            self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
-        )
+        self.moveID = ROW_COL_TO_SQUARE[endRow][endCol] | ROW_COL_TO_SQUARE[startRow][startCol] << 6
+        if self.isPawnPromotion:
+            self.moveID |= PROMOTION_QUEEN << 12
 
     def __eq__(self, other):
         if isinstance(other, Move):
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
+    def encode(self):
+        # the whole move in 32 bits, see decode
+        code = self.moveID | PIECE_CODES[self.pieceMoved] << 20 | PIECE_CODES[self.pieceCaptured] << 24
+        if self.isEnpassantMove:
+            code |= ENPASSANT_FLAG
+        if self.isCastleMove:
+            code |= CASTLE_FLAG
+        if self.isCapture:
+            code |= CAPTURE_FLAG
+        return code
+
+    @classmethod
+    def decode(cls, code):
+        # rebuilds a move from encode() without needing the board
+        move = cls.__new__(cls)
+        move.startRow, move.startCol = SQUARE_TO_ROW_COL[(code >> 6) & 63]
+        move.endRow, move.endCol = SQUARE_TO_ROW_COL[code & 63]
+        move.pieceMoved = CODE_PIECES[(code >> 20) & 15]
+        move.pieceCaptured = CODE_PIECES[(code >> 24) & 15]
+        move.isPawnPromotion = (code >> 12) & 7 != 0
+        move.isEnpassantMove = code & ENPASSANT_FLAG != 0
+        move.isCastleMove = code & CASTLE_FLAG != 0
+        move.isCapture = code & CAPTURE_FLAG != 0
+        move.moveID = code & 0xFFFF
+        return move
+
     def getChessNotation(self, moveLog):
         return "" if moveLog == None else moveLog[len(moveLog)-1]
 
     def getRankFile(self, r, c):
         return self.colsToFiles[c] + self.rowsToRanks[r]
 
+    def getUCINotation(self):
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        return notation + "q" if self.isPawnPromotion else notation
+
     def __str__(self):
         if self.isCastleMove:
             return "O-O" if self.endCol == 6 else "O-O-O"
@@ -462,3 +1434,21 @@ class Move:
         if self.isCapture:
             moveString += "x"
         return moveString + endSquare
+
+
+def encodeMoves(moves):
+    return array("I", [move.encode() for move in moves])
+
+
+def decodeMoves(codes):
+    return [Move.decode(code) for code in codes]
+
+
+BACKENDS = {"mailbox": GameState, "bitboard": BitboardGameState}
+
+
+def newGameState(backend="bitboard", fen=None):
+    gs = BACKENDS[backend]()
+    if fen is not None:
+        gs.loadFen(fen)
+    return gs
@@ -2,7 +2,7 @@ from os import environ
 environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
 import pygame as p
 import ChessEngine, ChessAI
-from multiprocessing import Process, Queue
+from EngineWorker import EngineWorker
 
 BOARD_WIDTH = BOARD_HEIGHT = 512
 MOVE_LOG_PANEL_WIDTH = 250
@@ -10,7 +10,18 @@ MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT
 DIMENTIONS = 8
 SQ_SIZE = BOARD_HEIGHT // DIMENTIONS
 MAX_FPS = 16
+ENGINE_BACKEND = "bitboard" # "mailbox" or "bitboard", see ChessEngine.BACKENDS
+AI_MOVE_TIME_MS = 2000 # search budget per AI move
+AI_WORKERS = 1 # search processes per AI move, more than 1 uses ChessAI.findBestMoveParallel
+PONDER = True # search on the human's time for the reply the AI expects
+OPENING_BOOK = None # path of a book built with "python src/OpeningBook.py build", None to always search
+BITBASES = None # directory of tables written by "python src/Bitbases.py", None to search without them
 IMAGES = {}
+FONTS = {}
+boardLayer = None # squares and coordinates, see renderBoardLayer
+highlightSurface = None # yellow overlay of the selected square
+drawnState = {} # what drawGameState last drew: (row, col) -> (piece, mark) and "endText"
+moveLogPanel = None # MoveLogPanel, created in main
 
 def loadImages():
     # Normal board
@@ -26,9 +37,12 @@ def main():
     screen = p.display.set_mode((BOARD_WIDTH + MOVE_LOG_PANEL_WIDTH, BOARD_HEIGHT), p.SRCALPHA)
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
-    gs = ChessEngine.GameState()
+    gs = ChessEngine.newGameState(ENGINE_BACKEND)
 
-    moveLogFont = p.font.SysFont("Arial", 14, False, False)
+    loadFonts()
+    renderBoardLayer()
+    global moveLogPanel
+    moveLogPanel = MoveLogPanel(p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT), FONTS["moveLog"])
     
     validMoves = gs.getValidMoves()
     moveMade = False
@@ -43,7 +57,7 @@ def main():
     playerTwo = False
 
     AIThinking = False
-    moveFinderProcess = None
+    engine = EngineWorker(ENGINE_BACKEND, OPENING_BOOK, BITBASES)
     moveUndone = False
 
     while running:
@@ -52,7 +66,11 @@ def main():
             if e.type == p.QUIT:
                 running = False
         
-            elif e.type == p.MOUSEBUTTONDOWN:
+            elif e.type == p.MOUSEWHEEL:
+                if moveLogPanel.rect.collidepoint(p.mouse.get_pos()):
+                    moveLogPanel.scroll(-e.y)
+
+            elif e.type == p.MOUSEBUTTONDOWN and e.button not in (4, 5): # 4 and 5 are the wheel
                 if not gameOver and humanTurn:
                     location = p.mouse.get_pos()
                     col = location[0]//SQ_SIZE
@@ -70,6 +88,8 @@ def main():
                             if move == validMoves[i]:
                                 gs.makeMove(validMoves[i])
                                 moveMade = True
+                                # on a ponder hit the search already running becomes the AI's move
+                                AIThinking = engine.ponderHit(validMoves[i].getUCINotation(), AI_MOVE_TIME_MS)
                                 sqSelected = ()
                                 playerClicks = []
                         if not moveMade:
@@ -82,20 +102,20 @@ def main():
                     gs.undoMove()
                     moveMade = True
                     gameOver = False
-                    if AIThinking:
-                        moveFinderProcess.terminate()
+                    if AIThinking or engine.pondering:
+                        engine.cancel()
                         AIThinking = False
                     moveUndone = True
 
                 if e.key == p.K_r:
-                    gs = ChessEngine.GameState()
+                    gs = ChessEngine.newGameState(ENGINE_BACKEND)
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
                     playerClicks = []
                     moveMade = False
                     gameOver = False
-                    if AIThinking:
-                        moveFinderProcess.terminate()
+                    if AIThinking or engine.pondering:
+                        engine.cancel()
                         AIThinking = False
                     moveUndone = True
         
@@ -104,40 +124,80 @@ def main():
                 AIThinking = True
                 print("Thinking...")
 
-                returnQueue = Queue()
-                moveFinderProcess = Process(target=ChessAI.findBestMove, args=(gs, validMoves, returnQueue))
-                moveFinderProcess.start()
+                engine.setPosition(None, [move.getUCINotation() for move in gs.moveLog])
+                engine.search(AI_MOVE_TIME_MS, None, AI_WORKERS)
 
-            if not moveFinderProcess.is_alive():
+            AIMoveText = engine.poll()
+            if not engine.searching:
                 print("Done thinking!")
-                AIMove = returnQueue.get()
+                AIMove = gs.getMoveFromUCI(AIMoveText) if AIMoveText is not None else None
                 if AIMove is None:
                     AIMove = ChessAI.findRandomMove(validMoves)
                 print("AI move: ", AIMove)
                 gs.makeMove(AIMove)
                 moveMade = True
                 AIThinking = False
+                # no pondering once the game is over
+                if PONDER and gs.getValidMoves() and not gs.draw:
+                    engine.setPosition(None, [move.getUCINotation() for move in gs.moveLog])
+                    engine.ponder(AI_WORKERS)
 
         if moveMade:
             validMoves = gs.getValidMoves()
             moveMade = False
             moveUndone = False
 
-        drawGameState(screen, gs, validMoves, sqSelected, moveLogFont)
-
+        text = None
         if gs.checkMate or gs.draw or gs.staleMate:
             gameOver = True
             text = 'Stale mate!!!' if gs.staleMate else 'Draw!!!' if gs.draw else 'Black wins by checkmate' if gs.whiteToMove else 'White wins by checkmate'
-            drawEndGameText(screen, text)
+        dirtyRects = drawGameState(screen, gs, validMoves, sqSelected, text)
 
         clock.tick(MAX_FPS)
-        p.display.flip()
+        p.display.update(dirtyRects)
+
+    engine.quit()
+
+def loadFonts():
+    # fonts live as long as the app, SysFont looks them up on every call
+    FONTS["rank"] = p.font.SysFont('comicsans', 14, bold=True)
+    FONTS["file"] = p.font.SysFont('comicsans', 18)
+    FONTS["moveLog"] = p.font.SysFont("Arial", 14, False, False)
+    FONTS["endGame"] = p.font.SysFont("Montserrat Black", 32, True, False)
+
+def renderBoardLayer():
+    # the squares and their coordinates never change, so they are drawn once
+    # and every frame copies the squares it needs from this surface
+    global boardLayer, highlightSurface
+    boardLayer = p.Surface((BOARD_WIDTH, BOARD_HEIGHT))
+    drawBoard(boardLayer)
+    highlightSurface = p.Surface((SQ_SIZE, SQ_SIZE))
+    highlightSurface.set_alpha(100) # Transperent value 0 -> 255
+    highlightSurface.fill(p.Color('yellow'))
+
+def drawGameState(screen, gs, validMoves, sqSelected, endText=None):
+    # Draws what changed since the last call and returns the dirty rects for
+    # p.display.update: the squares whose piece or highlight changed, the move
+    # log when a move was made or undone, and the end game text over the board.
+    dirtyRects = []
+    marks = squareMarks(gs, validMoves, sqSelected)
+    redrawAll = drawnState.get("endText") != endText
+    for r in range(DIMENTIONS):
+        for c in range(DIMENTIONS):
+            square = (gs.board[r][c], marks.get((r, c)))
+            if redrawAll or drawnState.get((r, c)) != square:
+                drawnState[(r, c)] = square
+                dirtyRects.append(drawSquare(screen, r, c, *square))
+
+    moveLogPanel.sync(gs.moveLog)
+    if moveLogPanel.dirty:
+        moveLogPanel.draw(screen)
+        dirtyRects.append(moveLogPanel.rect)
 
-def drawGameState(screen, gs, validMoves, sqSelected, moveLogFont):
-    drawBoard(screen)
-    highlightSquares(screen, gs, validMoves, sqSelected)
-    drawPieces(screen, gs.board)
-    drawMoveLog(screen, gs, moveLogFont)
+    drawnState["endText"] = endText
+    if endText is not None and dirtyRects:
+        dirtyRects.append(drawEndGameText(screen, endText))
+    return dirtyRects
 
 def drawBoard(screen):
     WHITE = (237, 238, 209)
@@ -149,31 +209,37 @@ def drawBoard(screen):
             color = colors[((r+c)%2)]
             p.draw.rect(screen, color, p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
     
-        font = p.font.SysFont('comicsans', 14, bold=True)
-        text = font.render(str(8 - r), True, colors[0] if r % 2 == 1 else colors[1])
+        text = FONTS["rank"].render(str(8 - r), True, colors[0] if r % 2 == 1 else colors[1])
         text_rect = text.get_rect(center=(SQ_SIZE // 8, r * SQ_SIZE + SQ_SIZE // 4))
         screen.blit(text, text_rect)
         
     for c in range(DIMENTIONS):
-        font = p.font.SysFont('comicsans', 18)
-        text = font.render(chr(97 + c), True, colors[0] if c % 2 == 0 else colors[1])
+        text = FONTS["file"].render(chr(97 + c), True, colors[0] if c % 2 == 0 else colors[1])
         text_rect = text.get_rect(bottomright=(c * SQ_SIZE + SQ_SIZE - SQ_SIZE / 32, 8 * SQ_SIZE))
         screen.blit(text, text_rect)
 
-def highlightSquares(screen, gs, validMoves, sqSelected):
+def squareMarks(gs, validMoves, sqSelected):
+    # (row, col) -> "selected" for the selected piece, "dot" for its targets
+    marks = {}
     if sqSelected != ():
         r, c = sqSelected
         if gs.board[r][c][0] == ('w' if gs.whiteToMove else 'b'):
-            # highlight selected square
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100) # Transperent value 0 -> 255
-            s.fill(p.Color('yellow'))
-            screen.blit(s, (c*SQ_SIZE, r*SQ_SIZE))
-            # # highlight moves from that square
-            # s.fill(p.Color('yellow'))
+            marks[(r, c)] = "selected"
             for move in validMoves:
                 if move.startRow == r and move.startCol == c:
-                    drawDot(screen, (move.endCol*SQ_SIZE + SQ_SIZE//2, move.endRow*SQ_SIZE + SQ_SIZE//2), 10)
+                    marks[(move.endRow, move.endCol)] = "dot"
+    return marks
+
+def drawSquare(screen, r, c, piece, mark):
+    rect = p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE)
+    screen.blit(boardLayer, rect, rect)
+    if mark == "selected":
+        screen.blit(highlightSurface, rect)
+    elif mark == "dot":
+        drawDot(screen, rect.center, 10)
+    if piece != "--":
+        screen.blit(IMAGES[piece], rect)
+    return rect
 
 def drawDot(screen, center, alpha):
     inner_radius = 5  # Radius for the inner circle
@@ -184,44 +250,68 @@ def drawDot(screen, center, alpha):
     p.draw.circle(screen, outer_color, center, outer_radius)
     p.draw.circle(screen, inner_color, center, inner_radius)
 
-def drawPieces(screen, board):
-    for r in range(DIMENTIONS):
-        for c in range(DIMENTIONS):
-            piece = board[r][c]
-            if piece != "--":
-                screen.blit(IMAGES[piece], p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
-
-def drawMoveLog(screen, gs, font):
-    moveLogRect= p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
-    p.draw.rect(screen, p.Color(50, 50, 50), moveLogRect)
-    moveLog = gs.moveLog
-    moveTexts = []
-    for i in range(0, len(moveLog), 2):
-        moveString = str(i//2 + 1) + ". " + str(moveLog[i]) + "   "
+class MoveLogPanel:
+    # The move log with one rendered line per full move. Lines are kept from
+    # frame to frame: making a move adds to them and taking one back drops the
+    # lines it was on. Only the lines in the scrolled viewport are drawn, and a
+    # line is rendered the first time it is shown.
+    PADDING = 5
+    LINE_SPACING = 2
+
+    def __init__(self, rect, font):
+        self.rect = rect
+        self.font = font
+        self.moves = [] # the moves the lines were made from
+        self.lines = [] # rendered line, None until it is first shown
+        self.lineHeight = font.get_height() + self.LINE_SPACING
+        self.firstLine = 0 # topmost line in view
+        self.followLast = True # keep the newest move in view
+        self.dirty = True
+
+    def visibleLines(self):
+        return max(1, (self.rect.height - self.PADDING) // self.lineHeight)
+
+    def sync(self, moveLog):
+        # compares move objects from the end, so an unchanged log costs one test
+        kept = min(len(self.moves), len(moveLog))
+        while kept and self.moves[kept - 1] is not moveLog[kept - 1]:
+            kept -= 1
+        if kept == len(self.moves) == len(moveLog):
+            return
+        del self.moves[kept:]
+        del self.lines[kept // 2:]
+        self.moves.extend(moveLog[kept:])
+        self.lines.extend([None] * ((len(self.moves) + 1) // 2 - len(self.lines)))
+        self.scroll(len(self.lines) if self.followLast else 0)
+
+    def scroll(self, lines):
+        lastFirstLine = max(0, len(self.lines) - self.visibleLines())
+        self.firstLine = min(max(self.firstLine + lines, 0), lastFirstLine)
+        self.followLast = self.firstLine == lastFirstLine
+        self.dirty = True
+
+    def lineText(self, index):
+        text = str(index + 1) + ". " + str(self.moves[2 * index]) + "   "
         # Make sure black make a move
-        if i+1 < len(moveLog):
-            moveString += str(moveLog[i+1]) + "     "
-        moveTexts.append(moveString)
-
-    movePerRow = 1
-    padding = 5
-    lineSpacing = 2
-    textY = padding
-    for i in range(0, len(moveTexts), movePerRow):
-        text = ""
-        for j in range(movePerRow):
-            if i+j < len(moveTexts):
-                text += moveTexts[i+j]
-        textObject = font.render(text, True, p.Color('white'))
-        textLocation = moveLogRect.move(padding, textY)
-        screen.blit(textObject, textLocation)
-        textY += textObject.get_height() + lineSpacing
+        if 2 * index + 1 < len(self.moves):
+            text += str(self.moves[2 * index + 1]) + "     "
+        return text
+
+    def draw(self, screen):
+        p.draw.rect(screen, p.Color(50, 50, 50), self.rect)
+        textY = self.rect.top + self.PADDING
+        for index in range(self.firstLine, min(len(self.lines), self.firstLine + self.visibleLines())):
+            if self.lines[index] is None:
+                self.lines[index] = self.font.render(self.lineText(index), True, p.Color('white'))
+            screen.blit(self.lines[index], (self.rect.left + self.PADDING, textY))
+            textY += self.lineHeight
+        self.dirty = False
     
 def drawEndGameText(screen, text):
-    font = p.font.SysFont("Montserrat Black", 32, True, False)
-    textObject = font.render(text, 0, p.Color('gray'))
+    textObject = FONTS["endGame"].render(text, 0, p.Color('gray'))
     textLocation = p.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT).move(BOARD_WIDTH/2 - textObject.get_width()/2, BOARD_HEIGHT/2 - textObject.get_height()/2)
     screen.blit(textObject, textLocation)
+    return textObject.get_rect(topleft=textLocation.topleft).clip(p.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,248 @@
+import math
+import time
+from multiprocessing import Pipe, Process, RawValue
+
+import ChessAI
+import ChessEngine
+
+
+class EngineWorker:
+    # Handle to one long-lived search process. Commands go over a pipe, so the
+    # process, its hash table and its history scores survive from one move and
+    # one game to the next. Searches are numbered; stopping a search marks its
+    # number in shared memory and the search notices it on its next limit check.
+    # A ponder search runs on the opponent's time until ponderHit turns it into
+    # the search for our answer, by giving it a deadline in shared memory. The
+    # reply it ponders on comes with the result of the search before it.
+
+    def __init__(self, backend="bitboard", bookPath=None, bitbaseDirectory=None):
+        self.connection, workerConnection = Pipe()
+        self.stopID = RawValue("i", 0)
+        self.ponderDeadline = RawValue("d", 0.0)
+        self.searchID = 0
+        self.searching = False
+        self.pondering = False
+        self.ponderMove = None
+        self.expectedReply = None # the reply to the last search's move, from its hash table
+        self.process = Process(
+            target=engineLoop, args=(workerConnection, self.stopID, self.ponderDeadline, backend, bookPath, bitbaseDirectory)
+        )
+        self.process.start()
+        workerConnection.close()
+
+    def setPosition(self, fen=None, moves=()):
+        # fen defaults to the start position, moves are in coordinate notation
+        self.connection.send(("position", fen, list(moves)))
+
+    def search(self, timeLimitMs=None, nodeLimit=None, workers=1):
+        if self.pondering:
+            self.cancel()
+        self.searchID += 1
+        self.searching = True
+        self.connection.send(("search", self.searchID, timeLimitMs, nodeLimit, workers))
+
+    def ponder(self, workers=1):
+        # Searches the set position, with the opponent to move, until ponderHit
+        # or cancel. The worker plays the reply expected by the last search and
+        # searches our answer to it; without one it searches the position
+        # itself, which still leaves the hash table full of the replies.
+        if self.pondering:
+            self.cancel()
+        self.searchID += 1
+        self.searching = False
+        self.pondering = True
+        self.ponderMove = self.expectedReply
+        self.ponderDeadline.value = 0.0
+        self.connection.send(("ponder", self.searchID, self.ponderMove, workers))
+
+    def ponderHit(self, move, timeLimitMs=None):
+        # The opponent played move, in coordinate notation. When the worker is
+        # pondering that reply its search goes on with timeLimitMs from now
+        # and True is returned; poll then brings the answer as for search.
+        # Otherwise pondering stops and False says that a new search is needed.
+        if not self.pondering:
+            return False
+        if self.ponderMove is None or move != self.ponderMove:
+            self.cancel()
+            return False
+        self.pondering = False
+        self.searching = True
+        self.ponderDeadline.value = time.time() + timeLimitMs / 1000 if timeLimitMs is not None else math.inf
+        return True
+
+    def stop(self):
+        # the search still reports the best move it has found so far
+        self.stopID.value = self.searchID
+
+    def cancel(self):
+        # stops the search or pondering and drops its result
+        self.stop()
+        self.searching = False
+        self.pondering = False
+
+    def clearHash(self):
+        self.connection.send(("clear",))
+
+    def poll(self):
+        # the move of the current search in coordinate notation once it is done,
+        # otherwise None
+        while self.connection.poll():
+            message = self.connection.recv()
+            if message[1] == self.searchID and self.searching:
+                self.searching = False
+                self.expectedReply = message[3]
+                return message[2]
+        return None
+
+    def waitForMove(self, timeout=None):
+        # blocks until the current search is done; TimeoutError when that
+        # takes longer than timeout seconds
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            if deadline is not None and not self.connection.poll(max(deadline - time.time(), 0)):
+                raise TimeoutError("no move from the engine worker")
+            message = self.connection.recv()
+            if message[0] == "bestmove" and message[1] == self.searchID:
+                self.searching = False
+                self.expectedReply = message[3]
+                return message[2]
+
+    def quit(self):
+        self.cancel()
+        self.connection.send(("quit",))
+        self.process.join()
+        self.connection.close()
+
+
+class StopFlag:
+    # ChessAI.checkSearchLimits asks is_set(), like a multiprocessing.Event
+    def __init__(self, stopID, searchID, deadline=None):
+        self.stopID = stopID
+        self.searchID = searchID
+        self.deadline = deadline
+
+    def is_set(self):
+        if self.stopID.value >= self.searchID:
+            return True
+        return self.deadline is not None and 0 < self.deadline.value <= time.time()
+
+
+class ResultSender:
+    # takes the place of the queue ChessAI.findBestMove puts its move into, and
+    # sends the move with the reply to it the search expects
+    def __init__(self, connection, searchID, gs):
+        self.connection = connection
+        self.searchID = searchID
+        self.gs = gs
+
+    def put(self, move):
+        if move is None:
+            self.connection.send(("bestmove", self.searchID, None, None))
+            return
+        reply = expectedReply(self.gs, move)
+        self.connection.send(("bestmove", self.searchID, move.getUCINotation(), reply.getUCINotation() if reply is not None else None))
+
+
+def expectedReply(gs, move):
+    # the hash move of the position after move, None when there is none
+    gs.makeMove(move)
+    entry = ChessAI.transpositionTable.probe(gs.zobristKey)
+    reply = None
+    if entry is not None:
+        reply = next((nextMove for nextMove in gs.getValidMoves() if nextMove.moveID == entry[3]), None)
+    gs.undoMove()
+    return reply
+
+
+class KeptResult:
+    # holds a ponder search's move until it is known whether it is wanted
+    def __init__(self):
+        self.move = None
+
+    def put(self, move):
+        self.move = move
+
+
+def engineLoop(connection, stopID, ponderDeadline, backend, bookPath=None, bitbaseDirectory=None):
+    ChessAI.useOpeningBook(bookPath)
+    ChessAI.useBitbases(bitbaseDirectory)
+    gs = ChessEngine.newGameState(backend)
+    position = (None, [])
+    while True:
+        try:
+            command = connection.recv()
+        except EOFError:
+            break
+        if command[0] == "position":
+            _, fen, moves = command
+            previous = (gs, position)
+            played = 0
+            try:
+                # a position that continues the previous one only plays the new moves
+                if fen != position[0] or moves[: len(position[1])] != position[1]:
+                    gs = ChessEngine.newGameState(backend, fen)
+                    position = (fen, [])
+                for text in moves[len(position[1]):]:
+                    gs.makeMove(gs.getMoveFromUCI(text))
+                    played += 1
+                position = (fen, list(moves))
+            except ValueError as error:
+                # the command is dropped whole and the previous position kept
+                print(error)
+                for _ in range(played):
+                    gs.undoMove()
+                gs, position = previous
+        elif command[0] == "search":
+            _, searchID, timeLimitMs, nodeLimit, workers = command
+            ChessAI.searchStopEvent = StopFlag(stopID, searchID)
+            returnQueue = ResultSender(connection, searchID, gs)
+            validMoves = gs.getValidMoves()
+            if not validMoves:
+                returnQueue.put(None)
+            else:
+                if workers > 1:
+                    move, stats = ChessAI.findBestMoveParallel(gs, validMoves, returnQueue, timeLimitMs, nodeLimit, workers)
+                else:
+                    move, stats = ChessAI.findBestMove(gs, validMoves, returnQueue, timeLimitMs, nodeLimit)
+                # the search itself prints nothing, its counters go to the GUI's console
+                if stats.source == "search":
+                    print(stats, "\nhash fill: %.2f" % ChessAI.transpositionTable.fillRatio())
+                else:
+                    print(stats, move)
+            ChessAI.searchStopEvent = None
+        elif command[0] == "ponder":
+            _, searchID, replyText, workers = command
+            validMoves = gs.getValidMoves()
+            if not validMoves:
+                # the game is over, there is no reply to wait for
+                continue
+            stopFlag = StopFlag(stopID, searchID, ponderDeadline)
+            ChessAI.searchStopEvent = stopFlag
+            reply = None
+            if replyText is not None:
+                reply = next((move for move in validMoves if move.getUCINotation() == replyText), None)
+            if reply is not None:
+                gs.makeMove(reply)
+                validMoves = gs.getValidMoves()
+            result = KeptResult()
+            if validMoves:
+                if workers > 1:
+                    ChessAI.findBestMoveParallel(gs, validMoves, result, None, None, workers, ChessAI.MAX_DEPTH)
+                else:
+                    ChessAI.findBestMove(gs, validMoves, result, None, None, ChessAI.MAX_DEPTH)
+            # a search that ends by itself, at a mate or in the book, still waits
+            # for the opponent's move
+            while not stopFlag.is_set() and not ponderDeadline.value:
+                time.sleep(0.01)
+            if reply is not None and ponderDeadline.value:
+                ResultSender(connection, searchID, gs).put(result.move)
+                position = (position[0], position[1] + [reply.getUCINotation()])
+            elif reply is not None:
+                gs.undoMove()
+            ChessAI.searchStopEvent = None
+        elif command[0] == "clear":
+            ChessAI.clearHash()
+        elif command[0] == "quit":
+            break
+    ChessAI.releaseSharedHash()
+    connection.close()
@@ -0,0 +1,122 @@
+import argparse
+import json
+import re
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+
+import ChessAI
+import ChessEngine
+
+EPD_ID = re.compile(r'\bid\s+"([^"]*)"')
+PENDING_PER_WORKER = 2 # positions handed to the pool ahead of the one being written
+
+
+def readPositions(lines):
+    # Yields (line number, FEN, id) for every position line of an EPD or FEN
+    # file, as the lines are read. EPD operations other than id are dropped.
+    for lineNumber, line in enumerate(lines, 1):
+        fields = line.split()
+        if len(fields) < 4 or line.startswith("#"):
+            continue
+        if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+            yield lineNumber, " ".join(fields[:6]), None
+        else:
+            epdId = EPD_ID.search(line)
+            yield lineNumber, " ".join(fields[:4]), epdId.group(1) if epdId else None
+
+
+def analysePosition(task):
+    # searches one position; the result is a dict ready for json.dumps
+    (lineNumber, fen, epdId), limits, backend = task
+    result = {"line": lineNumber, "id": epdId}
+    try:
+        gs = ChessEngine.newGameState(backend, fen)
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+    result["fen"] = gs.getFen()
+    try:
+        searchPosition(gs, limits, result)
+    except Exception as error:
+        # one position the engine cannot handle must not end the whole run
+        result["error"] = "%s: %s" % (type(error).__name__, error)
+    return result
+
+
+def searchPosition(gs, limits, result):
+    validMoves = gs.getValidMoves()
+    if not validMoves:
+        result["bestmove"] = None
+        result["result"] = "checkmate" if gs.checkMate else "stalemate"
+        return
+
+    start = time.time()
+    depth, score, move = 0, 0, None
+    for depth, score, move in ChessAI.searchIterations(
+        gs, validMoves, limits["timeLimitMs"], limits["nodeLimit"], 1, limits["maxDepth"]
+    ):
+        pass
+    result["bestmove"] = move.getUCINotation()
+    result["san"] = gs.getMoveSAN(move, validMoves)
+    result["score"] = score # pawns, for the side to move
+    result["depth"] = depth
+    result["nodes"] = ChessAI.searchStats.totalNodes()
+    result["seconds"] = round(time.time() - start, 3)
+
+
+def analyse(lines, out, limits, workers=1, backend="bitboard"):
+    # Writes one JSON line per position to out, in input order. At most
+    # PENDING_PER_WORKER positions per worker are read ahead of the one being
+    # written, so memory stays flat however long the input is, and a slow
+    # reader of out holds back the input instead of piling up results.
+    tasks = ((position, limits, backend) for position in readPositions(lines))
+    count = 0
+    if workers <= 1:
+        for task in tasks:
+            out.write(json.dumps(analysePosition(task)) + "\n")
+            count += 1
+        return count
+
+    with Pool(workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(analysePosition, (task,)))
+            if len(pending) >= workers * PENDING_PER_WORKER:
+                out.write(json.dumps(pending.popleft().get()) + "\n")
+                count += 1
+        while pending:
+            out.write(json.dumps(pending.popleft().get()) + "\n")
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search every position of an EPD or FEN file and write JSON lines.")
+    parser.add_argument("input", nargs="?", default="-", help="EPD or FEN file, - for stdin")
+    parser.add_argument("--output", default="-", help="JSON lines file, - for stdout")
+    parser.add_argument("--depth", type=int, help="search depth per position")
+    parser.add_argument("--movetime", type=int, help="milliseconds per position")
+    parser.add_argument("--nodes", type=int, help="nodes per position")
+    parser.add_argument("--workers", type=int, default=ChessAI.SEARCH_WORKERS)
+    parser.add_argument("--backend", choices=sorted(ChessEngine.BACKENDS), default="bitboard")
+    args = parser.parse_args(argv)
+
+    limits = {"maxDepth": args.depth, "timeLimitMs": args.movetime, "nodeLimit": args.nodes}
+    inputFile = sys.stdin if args.input == "-" else open(args.input)
+    outputFile = sys.stdout if args.output == "-" else open(args.output, "w")
+    start = time.time()
+    try:
+        count = analyse(inputFile, outputFile, limits, args.workers, args.backend)
+    finally:
+        if inputFile is not sys.stdin:
+            inputFile.close()
+        if outputFile is not sys.stdout:
+            outputFile.close()
+    print("%d positions in %.1fs" % (count, time.time() - start), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+
+import ChessEngine
+from ChessBitboard import ROW_COL_TO_SQUARE
+
+# Polyglot layout: 16-byte big-endian entries of key, move, weight and learn,
+# sorted by key. Keys are this engine's own Zobrist keys, so books have to be
+# built with buildBook rather than taken from other Polyglot tools.
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+MAX_WEIGHT = 0xFFFF
+RESULT_WEIGHTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1), "*": (1, 1)}  # (white, black)
+
+
+def bookMoveID(move):
+    # Polyglot writes castling as the king taking its own rook
+    if move.isCastleMove:
+        rookCol = 7 if move.endCol == 6 else 0
+        return ROW_COL_TO_SQUARE[move.startRow][rookCol] | (move.moveID & (63 << 6))
+    return move.moveID
+
+
+class OpeningBook:
+    # The book file is memory mapped and binary searched in place, so only the
+    # pages a lookup touches are ever read.
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size // ENTRY.size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+    def close(self):
+        if self.size:
+            self.map.close()
+        self.file.close()
+
+    def getEntries(self, key):
+        # [(bookMoveID, weight)] stored for the position key
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.map, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.size:
+            entryKey, moveID, weight, _ = ENTRY.unpack_from(self.map, low * ENTRY.size)
+            if entryKey != key:
+                break
+            entries.append((moveID, weight))
+            low += 1
+        return entries
+
+    def findMove(self, gs, validMoves=None, rng=random):
+        # a legal book move picked at random in proportion to its weight, or None
+        entries = self.getEntries(gs.zobristKey)
+        if not entries:
+            return None
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+        byID = {bookMoveID(move): move for move in validMoves}
+        candidates = [(byID[moveID], weight) for moveID, weight in entries if moveID in byID and weight > 0]
+        if not candidates:
+            return None
+        pick = rng.uniform(0, sum(weight for _, weight in candidates))
+        for move, weight in candidates:
+            pick -= weight
+            if pick <= 0:
+                return move
+        return candidates[-1][0]
+
+
+def readPgnGames(text):
+    # yields (result, [SAN moves]) for every game in a PGN collection;
+    # comments, variations, NAGs and move numbers are dropped
+    result = "*"
+    moves = []
+    inGame = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("["):
+            if inGame:
+                yield result, moves
+                result, moves, inGame = "*", [], False
+            tag = re.match(r'\[Result\s+"([^"]*)"\]', line)
+            if tag:
+                result = tag.group(1)
+            continue
+        if line:
+            moves.append(line)
+            inGame = True
+    if inGame:
+        yield result, moves
+
+
+def tokenizeMovetext(lines):
+    text = re.sub(r"\{[^}]*\}|;[^\n]*", " ", "\n".join(lines))
+    while "(" in text:
+        text = re.sub(r"\([^()]*\)", " ", text)
+    tokens = []
+    for token in text.split():
+        token = re.sub(r"^\d+\.+", "", token)
+        if token and not token.startswith("$") and token not in RESULT_WEIGHTS:
+            tokens.append(token)
+    return tokens
+
+
+def buildBook(pgnPaths, bookPath, maxPly=20, backend="bitboard"):
+    # Plays the first maxPly moves of every game and weights each move by the
+    # game's result for the side that played it: 2 for a win, 1 for a draw.
+    # Returns the number of entries written.
+    weights = {}
+    for pgnPath in pgnPaths:
+        with open(pgnPath, encoding="utf-8", errors="replace") as pgnFile:
+            text = pgnFile.read()
+        for result, lines in readPgnGames(text):
+            white, black = RESULT_WEIGHTS.get(result, (1, 1))
+            gs = ChessEngine.newGameState(backend)
+            for san in tokenizeMovetext(lines)[:maxPly]:
+                try:
+                    move = gs.getMoveFromSAN(san)
+                except ValueError:
+                    break
+                weight = white if gs.whiteToMove else black
+                if weight:
+                    entry = (gs.zobristKey, bookMoveID(move))
+                    weights[entry] = weights.get(entry, 0) + weight
+                gs.makeMove(move)
+
+    scale = max(1, -(-max(weights.values(), default=0) // MAX_WEIGHT))
+    entries = sorted(weights.items(), key=lambda item: (item[0][0], -item[1]))
+    with open(bookPath, "wb") as bookFile:
+        for (key, moveID), weight in entries:
+            bookFile.write(ENTRY.pack(key, moveID, max(1, weight // scale), 0))
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query an opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile a book from PGN files")
+    build.add_argument("book")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("--plies", type=int, default=20, help="moves per game to take into the book")
+    probe = commands.add_parser("probe", help="list the book moves of a position")
+    probe.add_argument("book")
+    probe.add_argument("--fen", help="defaults to the start position")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print(buildBook(args.pgn, args.book, args.plies), "entries written to", args.book)
+    else:
+        book = OpeningBook(args.book)
+        gs = ChessEngine.newGameState("bitboard", args.fen)
+        byID = {bookMoveID(move): move for move in gs.getValidMoves()}
+        for moveID, weight in book.getEntries(gs.zobristKey):
+            move = byID.get(moveID)
+            print(move.getUCINotation() if move else "?", weight)
+        book.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import argparse
+import sys
+import time
+
+import ChessEngine
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Reference leaf counts from depth 1 upwards. The engine only promotes to a
+# queen, so each list stops before the first depth where promotions appear.
+POSITIONS = {
+    "start": (START_FEN, [20, 400, 8902, 197281, 4865609]),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862]),
+    "endgame": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    "castling": ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", [26, 568, 13744, 314346]),
+    "castle-rights": ("r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", [26, 1141, 27826]),
+    "castle-prevented": ("r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", [44, 1494, 50509]),
+    "short-castle": ("5k2/8/8/8/8/8/8/4K2R w K - 0 1", [15, 66, 1198, 6399]),
+    "long-castle": ("3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", [16, 71, 1286, 7418]),
+    "enpassant-pin": ("8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", [15, 126, 1928, 13931]),
+    "enpassant-rank-pin": ("3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", [18, 92, 1670, 10138]),
+    "discovered-check": ("8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", [37, 183, 6559]),
+}
+
+
+def perft(gs, depth):
+    moves = gs.getValidMoves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+def divide(gs, depth):
+    # leaf counts below each root move, in generation order
+    counts = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        counts.append((move.getUCINotation(), perft(gs, depth - 1)))
+        gs.undoMove()
+    return counts
+
+
+def timedPerft(gs, depth):
+    start = time.perf_counter()
+    nodes = perft(gs, depth)
+    seconds = time.perf_counter() - start
+    return nodes, seconds, nodes / seconds if seconds > 0 else 0.0
+
+
+def checkPosition(name, depth=None, backend="bitboard", out=None):
+    # Compares perft against the reference counts up to depth and returns True
+    # if every depth matches.
+    fen, expected = POSITIONS[name]
+    depth = len(expected) if depth is None else min(depth, len(expected))
+    gs = ChessEngine.newGameState(backend, fen)
+    ok = True
+    for d in range(1, depth + 1):
+        nodes, seconds, nps = timedPerft(gs, d)
+        passed = nodes == expected[d - 1]
+        ok = ok and passed
+        if out is not None:
+            print("%-20s depth %d %10d %s  %.2fs %8.0f nps" % (
+                name, d, nodes, "ok" if passed else "FAIL expected %d" % expected[d - 1], seconds, nps), file=out)
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count leaf nodes of the move generator.")
+    parser.add_argument("--fen", help="position to count, defaults to the start position")
+    parser.add_argument("--position", choices=sorted(POSITIONS), help="one of the standard positions")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--backend", choices=sorted(ChessEngine.BACKENDS), default="bitboard")
+    parser.add_argument("--divide", action="store_true", help="print the count below each root move")
+    parser.add_argument("--check", action="store_true",
+                        help="check the standard positions against their reference counts up to --depth")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        names = [args.position] if args.position else list(POSITIONS)
+        failed = [name for name in names if not checkPosition(name, args.depth, args.backend, sys.stdout)]
+        print("all positions ok" if not failed else "failed: " + ", ".join(failed))
+        return 1 if failed else 0
+
+    fen = POSITIONS[args.position][0] if args.position else (args.fen or START_FEN)
+    gs = ChessEngine.newGameState(args.backend, fen)
+    if args.divide:
+        start = time.perf_counter()
+        counts = divide(gs, args.depth)
+        seconds = time.perf_counter() - start
+        for name, nodes in counts:
+            print("%s: %d" % (name, nodes))
+        total = sum(nodes for _, nodes in counts)
+        print("\nmoves %d, nodes %d, %.2fs, %.0f nps" % (len(counts), total, seconds, total / seconds if seconds > 0 else 0))
+    else:
+        for d in range(1, args.depth + 1):
+            nodes, seconds, nps = timedPerft(gs, d)
+            print("depth %d %10d  %.2fs %8.0f nps" % (d, nodes, seconds, nps))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
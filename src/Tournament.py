@@ -0,0 +1,248 @@
+import argparse
+import math
+import sys
+import time
+from multiprocessing import Pool
+
+import ChessAI
+import ChessEngine
+from Perft import START_FEN
+from TranspositionTable import TranspositionTable
+
+HASH_SIZE_MB = 4  # per engine and worker process
+# Adjudication: a side whose own score stays at or below -resignScore pawns for
+# resignMoves moves in a row loses; after drawAfterPly plies, drawMoves moves
+# in a row by both sides within drawScore of 0 are a draw; maxPlies ends the
+# game as a draw.
+ADJUDICATION = {"maxPlies": 300, "resignScore": 10, "resignMoves": 4, "drawScore": 0.3, "drawMoves": 10, "drawAfterPly": 80}
+SEARCH_SETTINGS = {"depth": "maxDepth", "time": "timeLimitMs", "nodes": "nodeLimit"}
+
+engineTables = {}  # engine name -> its own hash table and history in this process
+
+
+def parseSettings(text):
+    # "depth=3,time=200,nodes=20000"; without time or nodes depth defaults to ChessAI.DEPTH
+    settings = {"maxDepth": None, "timeLimitMs": None, "nodeLimit": None}
+    for part in filter(None, text.split(",")):
+        name, _, value = part.partition("=")
+        if name not in SEARCH_SETTINGS:
+            raise ValueError("unknown search setting: " + name)
+        settings[SEARCH_SETTINGS[name]] = int(value)
+    return settings
+
+
+def readEpd(path):
+    # the positions of an EPD file as FEN strings, operations dropped
+    positions = []
+    with open(path) as epdFile:
+        for line in epdFile:
+            fields = line.split()
+            if len(fields) >= 4 and not line.startswith("#"):
+                positions.append(" ".join(fields[:4]) + " 0 1")
+    return positions
+
+
+def searchMove(gs, validMoves, name, settings):
+    # (depth, score, move) of the last finished iteration, score for the side to move
+    if name not in engineTables:
+        engineTables[name] = (TranspositionTable(HASH_SIZE_MB), {})
+    ChessAI.transpositionTable, ChessAI.historyTable = engineTables[name]
+    result = (0, 0, None)
+    for result in ChessAI.searchIterations(
+        gs, validMoves, settings["timeLimitMs"], settings["nodeLimit"], 1, settings["maxDepth"]
+    ):
+        pass
+    return result
+
+
+def playGame(task):
+    # plays one game; task is (round, fen, (white, black) names, (white, black)
+    # settings, adjudication) and the result a dict for writePgn and summarize
+    round, fen, names, settings, adjudication = task
+    gs = ChessEngine.newGameState("bitboard", fen)
+    sanMoves = []
+    thinkingTime = [0.0, 0.0]
+    losingMoves = [0, 0]
+    drawnMoves = 0
+    start = time.time()
+    while True:
+        validMoves = gs.getValidMoves()
+        if gs.checkMate:
+            result, termination = ("0-1" if gs.whiteToMove else "1-0"), "checkmate"
+            break
+        if gs.staleMate or gs.draw:
+            if gs.staleMate:
+                termination = "stalemate"
+            elif gs.isRepetition(2):
+                termination = "threefold repetition"
+            elif gs.halfmoveClock >= 100:
+                termination = "fifty-move rule"
+            else:
+                termination = "insufficient material"
+            result = "1/2-1/2"
+            break
+        if len(sanMoves) >= adjudication["maxPlies"]:
+            result, termination = "1/2-1/2", "move limit"
+            break
+
+        side = 0 if gs.whiteToMove else 1
+        moveStart = time.time()
+        _, score, move = searchMove(gs, validMoves, names[side], settings[side])
+        thinkingTime[side] += time.time() - moveStart
+
+        losingMoves[side] = losingMoves[side] + 1 if score <= -adjudication["resignScore"] else 0
+        if losingMoves[side] >= adjudication["resignMoves"]:
+            result, termination = ("0-1" if side == 0 else "1-0"), "adjudicated loss"
+            break
+        if len(sanMoves) >= adjudication["drawAfterPly"] and abs(score) <= adjudication["drawScore"]:
+            drawnMoves += 1
+        else:
+            drawnMoves = 0
+        if drawnMoves >= 2 * adjudication["drawMoves"]:
+            result, termination = "1/2-1/2", "adjudicated draw"
+            break
+
+        sanMoves.append(gs.getMoveSAN(move, validMoves))
+        gs.makeMove(move)
+
+    return {
+        "round": round,
+        "fen": fen,
+        "white": names[0],
+        "black": names[1],
+        "result": result,
+        "termination": termination,
+        "moves": sanMoves,
+        "seconds": time.time() - start,
+        "thinkingTime": thinkingTime,
+    }
+
+
+def writePgn(game, pgnFile):
+    tags = [
+        ("Event", "ChessEngine self-play"),
+        ("Round", str(game["round"])),
+        ("White", game["white"]),
+        ("Black", game["black"]),
+        ("Result", game["result"]),
+    ]
+    if game["fen"] != START_FEN:
+        tags += [("SetUp", "1"), ("FEN", game["fen"])]
+    tags += [
+        ("Termination", game["termination"]),
+        ("PlyCount", str(len(game["moves"]))),
+        ("WhiteSeconds", "%.2f" % game["thinkingTime"][0]),
+        ("BlackSeconds", "%.2f" % game["thinkingTime"][1]),
+    ]
+    for name, value in tags:
+        pgnFile.write('[%s "%s"]\n' % (name, value))
+
+    # plies are counted from white's first move, so a game that starts with
+    # black to move begins at ply 1
+    firstPly = 0 if game["fen"].split()[1] == "w" else 1
+    tokens = []
+    for ply, san in enumerate(game["moves"], firstPly):
+        if ply % 2 == 0:
+            tokens.append("%d." % (ply // 2 + 1))
+        elif ply == firstPly:
+            tokens.append("%d..." % (ply // 2 + 1))
+        tokens.append(san)
+    tokens.append(game["result"])
+    line = ""
+    pgnFile.write("\n")
+    for token in tokens:
+        if line and len(line) + len(token) + 1 > 79:
+            pgnFile.write(line + "\n")
+            line = token
+        else:
+            line = line + " " + token if line else token
+    pgnFile.write(line + "\n\n")
+
+
+def eloDifference(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+
+def summarize(games, name):
+    # wins, draws and losses of the named engine, and its Elo difference with a
+    # 95% interval from the spread of its per-game scores
+    wins = sum(1 for game in games if game["result"] == ("1-0" if game["white"] == name else "0-1"))
+    losses = sum(1 for game in games if game["result"] == ("0-1" if game["white"] == name else "1-0"))
+    draws = len(games) - wins - losses
+    if not games:
+        return wins, draws, losses, 0.0, 0.0, 0.0
+    score = (wins + draws / 2) / len(games)
+    deviation = math.sqrt((wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / len(games))
+    margin = 1.96 * deviation / math.sqrt(len(games))
+    return wins, draws, losses, eloDifference(score), eloDifference(score - margin), eloDifference(score + margin)
+
+
+def makeTasks(games, openings, settings, adjudication):
+    # every opening is played twice, once with each engine as white
+    names = ("engine1", "engine2")
+    tasks = []
+    for round in range(games):
+        fen = openings[(round // 2) % len(openings)]
+        order = (0, 1) if round % 2 == 0 else (1, 0)
+        tasks.append((round + 1, fen, tuple(names[i] for i in order), tuple(settings[i] for i in order), adjudication))
+    return tasks
+
+
+def runTournament(games, settings, openings=(START_FEN,), adjudication=ADJUDICATION, workers=1, pgnFile=None, out=None):
+    tasks = makeTasks(games, list(openings), settings, adjudication)
+    results = []
+
+    def record(game):
+        results.append(game)
+        if pgnFile is not None:
+            writePgn(game, pgnFile)
+        if out is not None:
+            print("game %d %s-%s %s (%s) %d plies %.1fs" % (
+                game["round"], game["white"], game["black"], game["result"], game["termination"], len(game["moves"]), game["seconds"]), file=out)
+
+    if workers > 1:
+        with Pool(workers) as pool:
+            for game in pool.imap_unordered(playGame, tasks):
+                record(game)
+    else:
+        for task in tasks:
+            record(playGame(task))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play engine-vs-engine games without the GUI.")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--engine1", default="depth=%d" % ChessAI.DEPTH, help="search settings, e.g. depth=3,time=200,nodes=20000")
+    parser.add_argument("--engine2", default="depth=%d" % ChessAI.DEPTH)
+    parser.add_argument("--openings", help="EPD file of start positions, defaults to the initial position")
+    parser.add_argument("--workers", type=int, default=ChessAI.SEARCH_WORKERS)
+    parser.add_argument("--pgn", help="file to write the games to")
+    for name, value in ADJUDICATION.items():
+        parser.add_argument("--" + name, type=type(value), default=value)
+    args = parser.parse_args(argv)
+
+    settings = (parseSettings(args.engine1), parseSettings(args.engine2))
+    openings = readEpd(args.openings) if args.openings else [START_FEN]
+    adjudication = {name: getattr(args, name) for name in ADJUDICATION}
+    pgnFile = open(args.pgn, "w") if args.pgn else None
+    start = time.time()
+    try:
+        games = runTournament(args.games, settings, openings, adjudication, args.workers, pgnFile, sys.stdout)
+    finally:
+        if pgnFile is not None:
+            pgnFile.close()
+
+    wins, draws, losses, elo, low, high = summarize(games, "engine1")
+    print("\nengine1 (%s) vs engine2 (%s): +%d =%d -%d" % (args.engine1, args.engine2, wins, draws, losses))
+    print("Elo difference %.1f, 95%% interval [%.1f, %.1f]" % (elo, low, high))
+    print("%d games in %.1fs, %.2fs per game" % (len(games), time.time() - start, sum(game["seconds"] for game in games) / max(len(games), 1)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+EXACT = 0
+LOWER_BOUND = 1  # the search failed high, score is at least this
+UPPER_BOUND = 2  # the search failed low, score is at most this
+
+ENTRY_BYTES = 16  # checked key and packed data, 8 bytes each
+USED_FLAG = 1 << 26
+SCORE_SHIFT = 27
+SCORE_BIAS = 1 << 20  # scores are stored in tenths of a pawn, the evaluation's resolution
+
+
+def tableBytes(sizeMB):
+    # size of the buffer a table of sizeMB needs, e.g. for shared memory
+    buckets = 1
+    while buckets * 2 * 2 * ENTRY_BYTES <= sizeMB * 1024 * 1024:
+        buckets *= 2
+    return buckets * 2 * ENTRY_BYTES
+
+
+class TranspositionTable:
+    # Fixed-size hash table in flat arrays. Entries come in buckets of two: the
+    # first slot keeps the deepest result seen for its index, the second is
+    # always overwritten, so fresh shallow results never push out deep ones.
+    # data packs depth (8 bits), bound (2 bits), move ID (16 bits), a used flag
+    # and the score. The key is stored XORed with data, so an entry that another
+    # process was writing at the same time fails the key check instead of
+    # returning a mix of two positions.
+
+    def __init__(self, sizeMB=16, buffer=None):
+        # buffer, when given, is where the entries live, e.g. SharedMemory.buf
+        self.size = tableBytes(sizeMB) // ENTRY_BYTES
+        self.mask = self.size // 2 - 1
+        if buffer is None:
+            buffer = bytearray(self.size * ENTRY_BYTES)
+        self.buffer = memoryview(buffer)[: self.size * ENTRY_BYTES]
+        self.keys = self.buffer[: self.size * 8].cast("Q")
+        self.data = self.buffer[self.size * 8 :].cast("Q")
+        self.used = 0
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        self.buffer[:] = bytes(len(self.buffer))
+        self.used = 0
+        self.probes = 0
+        self.hits = 0
+
+    def release(self):
+        # drops the views so that a shared memory block can be closed
+        self.keys.release()
+        self.data.release()
+        self.buffer.release()
+
+    def probe(self, key):
+        # returns (depth, score, bound, moveID) or None
+        self.probes += 1
+        index = (key & self.mask) << 1
+        for slot in (index, index + 1):
+            data = self.data[slot]
+            if data and self.keys[slot] ^ data == key:
+                self.hits += 1
+                return data & 0xFF, ((data >> SCORE_SHIFT) - SCORE_BIAS) / 10, (data >> 8) & 0x3, (data >> 10) & 0xFFFF
+        return None
+
+    def store(self, key, depth, score, bound, moveID=0):
+        index = (key & self.mask) << 1
+        data = self.data
+        keys = self.keys
+        slot = index
+        old = data[index]
+        if old and keys[index] ^ old != key:
+            if depth < (old & 0xFF):
+                slot = index + 1
+            else:
+                # the old deep entry moves down to the always-replace slot
+                if not data[index + 1]:
+                    self.used += 1
+                keys[index + 1] = keys[index]
+                data[index + 1] = old
+        if not data[slot]:
+            self.used += 1
+        entry = ((round(score * 10) + SCORE_BIAS) << SCORE_SHIFT) | USED_FLAG | (moveID << 10) | (bound << 8) | depth
+        keys[slot] = key ^ entry
+        data[slot] = entry
+
+    def hitRate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def fillRatio(self):
+        return self.used / self.size
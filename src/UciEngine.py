@@ -0,0 +1,232 @@
+import queue
+import sys
+import threading
+import time
+
+import ChessAI
+import ChessEngine
+from TranspositionTable import TranspositionTable
+
+ENGINE_NAME = "ChessAI"
+ENGINE_AUTHOR = "anhpt0920"
+MOVES_TO_GO = 30 # moves the remaining time is shared between when the GUI does not say
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+GO_LIMITS = ("depth", "nodes", "movetime", "wtime", "btime", "winc", "binc", "movestogo")
+
+
+class SearchControl:
+    # ChessAI.searchStopEvent of a UCI search: set by stop, or once the
+    # deadline has passed. A search that has to wait for stop or ponderhit
+    # before it may answer keeps waiting set.
+    def __init__(self, waiting):
+        self.stopped = threading.Event()
+        self.deadline = None
+        self.waiting = waiting
+
+    def is_set(self):
+        return self.stopped.is_set() or (self.deadline is not None and time.time() >= self.deadline)
+
+
+class UciEngine:
+    # Commands come in through handle, one line at a time. Searches run on a
+    # thread of their own so that stop, ponderhit and isready are answered
+    # while they run; their info and bestmove lines go to out.
+
+    def __init__(self, out=sys.stdout, backend="bitboard"):
+        self.out = out
+        self.backend = backend
+        self.gs = ChessEngine.newGameState(backend)
+        self.threads = 1
+        self.searchThread = None
+        self.control = None
+        self.ponderTimeMs = None # time for the move once a ponder search is hit
+        self.outputLock = threading.Lock()
+
+    def send(self, line):
+        with self.outputLock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def handle(self, line):
+        # runs one command, False after quit
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max %d" % (ChessAI.HASH_SIZE_MB, MAX_HASH_MB))
+            self.send("option name Threads type spin default 1 min 1 max %d" % MAX_THREADS)
+            self.send("option name Ponder type check default false")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            ChessAI.clearHash()
+        elif command == "setoption":
+            self.stop()
+            self.setOption(args)
+        elif command == "position":
+            self.stop()
+            self.setPosition(args)
+        elif command == "go":
+            self.stop()
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "ponderhit":
+            self.ponderHit()
+        elif command == "quit":
+            self.stop()
+            return False
+        return True
+
+    def setOption(self, args):
+        # setoption name <name> [value <value>]
+        text = " ".join(args)
+        name, _, value = text.partition(" value ")
+        name = name.replace("name", "", 1).strip().lower()
+        try:
+            if name == "hash":
+                ChessAI.HASH_SIZE_MB = min(max(int(value), 1), MAX_HASH_MB)
+                ChessAI.transpositionTable = TranspositionTable(ChessAI.HASH_SIZE_MB)
+                # the parallel search makes a new shared table of the new size
+                ChessAI.releaseSharedHash()
+            elif name == "threads":
+                self.threads = min(max(int(value), 1), MAX_THREADS)
+        except ValueError:
+            self.send("info string bad value for " + name)
+
+    def setPosition(self, args):
+        # position (startpos | fen <fen>) [moves <move> ...]
+        movesAt = args.index("moves") if "moves" in args else len(args)
+        fen = " ".join(args[1:movesAt]) if args and args[0] == "fen" else None
+        try:
+            gs = ChessEngine.newGameState(self.backend, fen)
+            for text in args[movesAt + 1:]:
+                gs.makeMove(gs.getMoveFromUCI(text))
+        except ValueError as error:
+            self.send("info string " + str(error))
+            return
+        self.gs = gs
+
+    def go(self, args):
+        limits = {}
+        for index, token in enumerate(args[:-1]):
+            if token in GO_LIMITS:
+                try:
+                    limits[token] = int(args[index + 1])
+                except ValueError:
+                    pass
+        infinite = "infinite" in args
+        pondering = "ponder" in args
+        timeLimitMs = self.timeBudget(limits)
+        maxDepth = limits.get("depth")
+        if infinite or pondering:
+            maxDepth = maxDepth or ChessAI.MAX_DEPTH
+            self.ponderTimeMs = timeLimitMs if pondering else None
+            timeLimitMs = None
+        elif maxDepth is None and (timeLimitMs is not None or "nodes" in limits):
+            maxDepth = ChessAI.MAX_DEPTH
+        self.control = SearchControl(infinite or pondering)
+        self.searchThread = threading.Thread(
+            target=self.search, args=(self.control, timeLimitMs, limits.get("nodes"), maxDepth), daemon=True
+        )
+        self.searchThread.start()
+
+    def timeBudget(self, limits):
+        # milliseconds for this move, None for no time limit
+        if "movetime" in limits:
+            return limits["movetime"]
+        remaining = limits.get("wtime" if self.gs.whiteToMove else "btime")
+        if remaining is None:
+            return None
+        increment = limits.get("winc" if self.gs.whiteToMove else "binc", 0)
+        budget = remaining / limits.get("movestogo", MOVES_TO_GO) + increment * 3 / 4
+        return max(1, int(min(budget, remaining / 2)))
+
+    def stop(self):
+        # ends the running search, which still answers with its best move
+        if self.searchThread is not None:
+            self.control.waiting = False
+            self.control.stopped.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+    def ponderHit(self):
+        # the opponent played the move we pondered on: it is now our search
+        if self.control is not None and self.control.waiting:
+            if self.ponderTimeMs is not None:
+                self.control.deadline = time.time() + self.ponderTimeMs / 1000
+            self.control.waiting = False
+
+    def search(self, control, timeLimitMs, nodeLimit, maxDepth):
+        ChessAI.searchStopEvent = control
+        gs = self.gs
+        validMoves = gs.getValidMoves()
+        bestMove = None
+        if validMoves:
+            bestMove, stats = ChessAI.findInstantMove(gs, validMoves)
+            if bestMove is not None:
+                self.send("info string " + str(stats))
+        if bestMove is None and validMoves and self.threads > 1:
+            bestMove, stats = ChessAI.findBestMoveParallel(
+                gs, validMoves, queue.SimpleQueue(), timeLimitMs, nodeLimit, self.threads, maxDepth
+            )
+            self.send("info depth %d nodes %d time %d" % (stats.depths[-1][0] if stats.depths else 0, stats.totalNodes(), stats.seconds * 1000))
+        elif bestMove is None and validMoves:
+            for depth, score, bestMove in ChessAI.searchIterations(gs, validMoves, timeLimitMs, nodeLimit, 1, maxDepth):
+                self.sendInfo(depth, score, bestMove)
+        # infinite and ponder searches answer only after stop or ponderhit
+        while control.waiting and not control.is_set():
+            time.sleep(0.01)
+        ChessAI.searchStopEvent = None
+
+        if bestMove is None:
+            self.send("bestmove 0000")
+            return
+        pv = self.principalVariation(bestMove, 2)
+        self.send("bestmove " + pv[0] + (" ponder " + pv[1] if len(pv) > 1 else ""))
+
+    def sendInfo(self, depth, score, move):
+        stats = ChessAI.searchStats
+        if abs(score) >= ChessAI.MATE_SCORE:
+            plies = round(ChessAI.CHECKMATE - abs(score))
+            scoreText = "mate %d" % ((plies + 1) // 2 if score > 0 else -(plies // 2))
+        else:
+            scoreText = "cp %d" % round(score * 100)
+        self.send(
+            "info depth %d score %s nodes %d nps %d time %d pv %s"
+            % (depth, scoreText, stats.totalNodes(), stats.nodesPerSecond(), stats.seconds * 1000, " ".join(self.principalVariation(move, depth)))
+        )
+
+    def principalVariation(self, move, length):
+        # move followed by the hash moves of the positions it leads to
+        gs = self.gs
+        pv = []
+        while move is not None and len(pv) < length:
+            pv.append(move.getUCINotation())
+            gs.makeMove(move)
+            entry = ChessAI.transpositionTable.probe(gs.zobristKey)
+            hashMoveID = entry[3] if entry is not None else 0
+            move = next((nextMove for nextMove in gs.getValidMoves() if nextMove.moveID == hashMoveID), None) if hashMoveID else None
+        for _ in pv:
+            gs.undoMove()
+        return pv
+
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.stop()
+    ChessAI.releaseSharedHash()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import BatchEvaluator
+import ChessAI
+import ChessEngine
+
+
+def randomPositions(count, seed):
+    rng = random.Random(seed)
+    states = []
+    gs = ChessEngine.newGameState("mailbox")
+    while len(states) < count:
+        moves = gs.getValidMoves()
+        if not moves or len(gs.moveLog) > 120:
+            gs = ChessEngine.newGameState("mailbox")
+            continue
+        gs.makeMove(rng.choice(moves))
+        states.append(ChessEngine.newGameState("mailbox"))
+        states[-1].board = [row[:] for row in gs.board]
+        states[-1].computeScores()
+    return states
+
+
+def test_batch_scores_equal_score_board():
+    states = randomPositions(300, 8)
+    codes = BatchEvaluator.encodeGameStates(states)
+    assert codes.shape == (300, 64) and codes.dtype == np.int8
+    expected = [ChessAI.scoreBoard(gs) for gs in states]
+    assert BatchEvaluator.scoreBatch(codes).tolist() == expected
+    assert BatchEvaluator.scoreBatch(BatchEvaluator.toPlanes(codes)).tolist() == expected
+
+
+def test_encoding_uses_the_move_piece_codes():
+    codes = BatchEvaluator.encodeBoards([ChessEngine.newGameState().board])
+    assert codes[0, 0] == ChessEngine.PIECE_CODES["bR"]
+    assert codes[0, 63] == ChessEngine.PIECE_CODES["wR"]
+    assert codes[0, 32] == 0
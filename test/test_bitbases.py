@@ -0,0 +1,71 @@
+import pytest
+
+import Bitbases
+import ChessAI
+import ChessEngine
+
+
+class ListQueue:
+    def __init__(self):
+        self.items = []
+
+    def put(self, item):
+        self.items.append(item)
+
+
+@pytest.fixture(scope="module")
+def tables(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("bitbases")
+    Bitbases.writeTables(str(directory), ["KRK"])
+    bitbases = Bitbases.Bitbases(str(directory))
+    yield bitbases
+    bitbases.close()
+
+
+def test_probe_sees_mates_and_draws(tables):
+    gs = ChessEngine.newGameState("mailbox", "k6R/8/1K6/8/8/8/8/8 b - - 0 1")
+    assert tables.probe(gs) == (-1, 0)
+    gs = ChessEngine.newGameState("mailbox", "k7/8/1K6/8/8/8/8/7R w - - 0 1")
+    assert tables.probe(gs) == (1, 1)
+    # black has the rook, so the table is read mirrored
+    gs = ChessEngine.newGameState("mailbox", "8/8/8/3k4/3r4/8/8/7K w - - 0 1")
+    assert tables.probe(gs)[0] == -1
+    # the rook hangs
+    gs = ChessEngine.newGameState("mailbox", "8/8/8/3k4/3R4/8/8/7K b - - 0 1")
+    assert tables.probe(gs) == (0, None)
+    gs = ChessEngine.newGameState("mailbox", "8/8/8/3k4/8/8/8/2QR3K b - - 0 1")
+    assert tables.probe(gs) is None
+
+
+def test_engine_mates_in_the_bitbase_distance(tables, monkeypatch, capsys):
+    monkeypatch.setattr(ChessAI, "bitbases", tables)
+    gs = ChessEngine.newGameState("bitboard", "8/8/8/3k4/8/8/8/R6K w - - 0 1")
+    result, plies = tables.probe(gs)
+    assert result == 1
+    for _ in range(plies):
+        queue = ListQueue()
+        _, stats = ChessAI.findBestMove(gs, gs.getValidMoves(), queue)
+        assert stats.source == "bitbase"
+        gs.makeMove(queue.items[0])
+    gs.getValidMoves()
+    assert gs.checkMate
+    assert capsys.readouterr().out == ""
+
+
+def test_kpk_comes_with_kqk_and_a_promotion_out_of_the_tables_is_searched(tmp_path, monkeypatch):
+    # the tables' contents do not matter here, only which files exist
+    monkeypatch.setattr(Bitbases, "generate", lambda name, queenWins=None: bytearray(Bitbases.SIZE))
+    Bitbases.writeTables(str(tmp_path), ["KPK"])
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["KPK.wdl", "KQK.dtm", "KQK.wdl"]
+
+    (tmp_path / "KQK.wdl").unlink()
+    bitbases = Bitbases.Bitbases(str(tmp_path))
+    monkeypatch.setattr(ChessAI, "bitbases", bitbases)
+    try:
+        gs = ChessEngine.newGameState("mailbox", "8/4P3/8/8/8/2k5/8/4K3 w - - 0 1")
+        assert ChessAI.findBitbaseMove(gs, gs.getValidMoves()) is None
+        # capturing the pawn leaves bare kings, a draw the tables need not know
+        gs = ChessEngine.newGameState("mailbox", "8/8/8/8/8/2k5/3P4/4K3 b - - 0 1")
+        assert ChessAI.findBitbaseMove(gs, gs.getValidMoves()) is not None
+    finally:
+        bitbases.close()
@@ -0,0 +1,203 @@
+import random
+
+import pytest
+
+import ChessEngine
+
+
+def moveKeys(moves):
+    return sorted((m.moveID, m.isEnpassantMove, m.isCastleMove) for m in moves)
+
+
+def emptyPosition(backend, pieces, whiteToMove=True, enpassant=()):
+    gs = ChessEngine.newGameState(backend)
+    gs.board = [["--"] * 8 for _ in range(8)]
+    for (r, c), piece in pieces.items():
+        gs.board[r][c] = piece
+        if piece == "wK":
+            gs.whiteKingLocation = (r, c)
+        elif piece == "bK":
+            gs.blackKingLocation = (r, c)
+    gs.whiteToMove = whiteToMove
+    gs.currentCastlingRight = ChessEngine.CastleRights(False, False, False, False)
+    gs.castleRightsLog = [gs.currentCastlingRight]
+    gs.enpassantPossible = enpassant
+    gs.enpassantPossibleLog = [enpassant]
+    if backend == "bitboard":
+        gs.syncBitboards()
+    return gs
+
+
+def playRandomGames(games, plies, seed):
+    rng = random.Random(seed)
+    for _ in range(games):
+        mailbox = ChessEngine.newGameState("mailbox")
+        bitboard = ChessEngine.newGameState("bitboard")
+        for _ in range(plies):
+            yield mailbox, bitboard
+            moves = mailbox.getValidMoves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            mailbox.makeMove(move)
+            bitboard.makeMove(move)
+            if rng.random() < 0.1:
+                mailbox.undoMove()
+                bitboard.undoMove()
+
+
+def test_backends_generate_the_same_moves():
+    for mailbox, bitboard in playRandomGames(10, 80, seed=1):
+        assert mailbox.board == bitboard.board
+        assert moveKeys(mailbox.getValidMoves()) == moveKeys(bitboard.getValidMoves())
+        assert (mailbox.checkMate, mailbox.staleMate) == (bitboard.checkMate, bitboard.staleMate)
+
+
+def test_bitboards_stay_in_sync_with_board():
+    for _, bitboard in playRandomGames(10, 150, seed=2):
+        incremental = (dict(bitboard.bitboards), dict(bitboard.occupancy), bitboard.occupied)
+        bitboard.syncBitboards()
+        assert incremental == (bitboard.bitboards, bitboard.occupancy, bitboard.occupied)
+
+
+def test_enpassant_discovering_rank_check_is_illegal():
+    # white Ka5, Pb5; black Pc5 just double-pushed, rook h5 behind it
+    for backend in ChessEngine.BACKENDS:
+        gs = emptyPosition(
+            backend,
+            {(3, 0): "wK", (3, 1): "wP", (3, 2): "bP", (3, 7): "bR", (0, 7): "bK"},
+            enpassant=(2, 2),
+        )
+        moves = gs.getValidMoves()
+        assert not any(m.isEnpassantMove for m in moves)
+
+
+def test_double_check_allows_only_king_moves():
+    # black Ke8 checked by the rook on e1 and the knight on d6
+    for backend in ChessEngine.BACKENDS:
+        gs = emptyPosition(
+            backend,
+            {(0, 4): "bK", (0, 0): "bR", (2, 3): "wN", (7, 4): "wR", (7, 7): "wK"},
+            whiteToMove=False,
+        )
+        moves = gs.getValidMoves()
+        assert gs.inCheck
+        assert moves and all(m.pieceMoved == "bK" for m in moves)
+
+
+def test_castling_before_the_e_pawn_moves():
+    # 1. Nf3 Nf6 2. g3 g6 3. Bg2 Bg7 with both e-pawns still at home
+    for backend in ChessEngine.BACKENDS:
+        gs = ChessEngine.newGameState(backend)
+        for start, end in [((7, 6), (5, 5)), ((0, 6), (2, 5)), ((6, 6), (5, 6)),
+                           ((1, 6), (2, 6)), ((7, 5), (6, 6)), ((0, 5), (1, 6))]:
+            gs.makeMove(ChessEngine.Move(start, end, gs.board))
+        assert any(m.isCastleMove for m in gs.getValidMoves())
+
+
+def test_castling_through_a_pawn_attacked_square_is_illegal():
+    # the black pawn on e2 attacks f1, the black pawn on b2 attacks c1
+    for backend in ChessEngine.BACKENDS:
+        gs = emptyPosition(
+            backend,
+            {(7, 4): "wK", (7, 7): "wR", (7, 0): "wR", (6, 4): "bP", (6, 1): "bP", (0, 4): "bK"},
+        )
+        gs.currentCastlingRight = ChessEngine.CastleRights(True, False, True, False)
+        assert not any(m.isCastleMove for m in gs.getValidMoves())
+        assert gs.squareUnderAttack(7, 5) and gs.squareUnderAttack(7, 2)
+        assert not gs.squareUnderAttack(7, 6)
+
+
+def test_moves_round_trip_through_packed_codes():
+    gs = ChessEngine.newGameState("bitboard", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    gs.makeMove(gs.getMoveFromUCI("a2a3"))
+    gs.makeMove(gs.getMoveFromUCI("c7c5"))
+    moves = gs.getValidMoves()
+    codes = ChessEngine.encodeMoves(moves)
+    assert codes.typecode == "I"
+    for move, decoded in zip(moves, ChessEngine.decodeMoves(codes)):
+        assert decoded == move
+        assert str(decoded) == str(move)
+        for name in ChessEngine.Move.__slots__:
+            assert getattr(decoded, name) == getattr(move, name), name
+    assert any(move.isEnpassantMove for move in moves) and any(move.isCastleMove for move in moves)
+
+
+def test_move_id_uses_the_polyglot_layout():
+    gs = ChessEngine.newGameState()
+    move = gs.getMoveFromUCI("e2e4")
+    assert move.moveID == 28 | 12 << 6
+
+
+def test_fen_round_trips_through_get_fen():
+    random.seed(4)
+    for backend in ChessEngine.BACKENDS:
+        gs = ChessEngine.newGameState(backend, "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R b KQkq - 0 7")
+        assert gs.getFen() == "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R b KQkq - 0 7"
+        for _ in range(40):
+            validMoves = gs.getValidMoves()
+            if not validMoves:
+                break
+            gs.makeMove(random.choice(validMoves))
+            copy = ChessEngine.newGameState(backend, gs.getFen())
+            assert copy.board == gs.board and copy.zobristKey == gs.zobristKey
+            assert copy.getFen() == gs.getFen()
+        assert gs.getFen().endswith(" %d" % (7 + (len(gs.moveLog) + 1) // 2))
+
+
+def test_piece_counts_clock_and_draws_follow_make_and_undo():
+    for backend in ChessEngine.BACKENDS:
+        gs = ChessEngine.newGameState(backend)
+        rng = random.Random(9)
+        for _ in range(120):
+            validMoves = gs.getValidMoves()
+            if not validMoves:
+                break
+            gs.makeMove(rng.choice(validMoves))
+            assert gs.pieceCounts == gs.getPieceCounts()
+        while gs.moveLog:
+            gs.undoMove()
+            assert gs.pieceCounts == gs.getPieceCounts()
+        assert gs.halfmoveClock == 0 and gs.zobristHistory == [gs.zobristKey]
+
+        # knights out and back twice: the start position is on the board a third time
+        for text in ["g1f3", "g8f6", "f3g1", "f6g8"] * 2:
+            assert not gs.draw
+            gs.makeMove(gs.getMoveFromUCI(text))
+            gs.getValidMoves()
+        assert gs.draw and gs.isRepetition(2) and gs.halfmoveClock == 8
+        gs.undoMove()
+        gs.getValidMoves()
+        assert not gs.draw and gs.isRepetition() and not gs.isRepetition(2)
+
+        gs = ChessEngine.newGameState(backend, "4k3/8/8/8/8/8/4P3/R3K3 w - - 99 80")
+        gs.makeMove(gs.getMoveFromUCI("a1a2"))
+        gs.getValidMoves()
+        assert gs.draw and gs.getFen().endswith(" 100 80")
+        gs.undoMove()
+        gs.makeMove(gs.getMoveFromUCI("e2e4"))
+        gs.getValidMoves()
+        assert not gs.draw and gs.halfmoveClock == 0
+
+
+def test_castling_rights_without_king_and_rook_at_home_are_dropped():
+    for backend in ChessEngine.BACKENDS:
+        gs = ChessEngine.newGameState(backend, "4k3/8/8/8/8/8/8/7K w K - 0 1")
+        assert gs.getFen() == "4k3/8/8/8/8/8/8/7K w - - 0 1"
+        assert not any(move.isCastleMove for move in gs.getValidMoves())
+
+        gs = ChessEngine.newGameState(backend, "1r2k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+        assert gs.getFen() == "1r2k2r/8/8/8/8/8/8/R3K2R w KQk - 0 1"
+        assert sorted(move.getUCINotation() for move in gs.getValidMoves() if move.isCastleMove) == ["e1c1", "e1g1"]
+
+
+def test_impossible_positions_are_rejected():
+    for backend in ChessEngine.BACKENDS:
+        for fen in [
+            "4k3/4Q3/8/8/8/8/8/4K3 w - - 0 1",
+            "4k3/8/8/8/8/8/8/p3K3 b - - 0 1",
+            "P3k3/8/8/8/8/8/8/4K3 w - - 0 1",
+            "4k3/8/8/8/8/8/8/K3K3 w - - 0 1",
+        ]:
+            with pytest.raises(ValueError):
+                ChessEngine.newGameState(backend, fen)
@@ -0,0 +1,86 @@
+import ChessEngine
+from EngineWorker import EngineWorker
+
+TIMEOUT = 60 # seconds a search may take before the test fails instead of hanging
+
+
+def test_worker_keeps_its_position_and_answers_searches():
+    engine = EngineWorker("bitboard")
+    try:
+        engine.setPosition(None, ["e2e4", "e7e5"])
+        engine.search(nodeLimit=1000)
+        first = engine.waitForMove(TIMEOUT)
+        engine.setPosition(None, ["e2e4", "e7e5", first])
+        engine.search(nodeLimit=1000)
+        reply = engine.waitForMove(TIMEOUT)
+        gs = ChessEngine.newGameState()
+        for text in ["e2e4", "e7e5", first, reply]:
+            gs.makeMove(gs.getMoveFromUCI(text))
+    finally:
+        engine.quit()
+
+
+def test_cancelled_search_result_is_dropped():
+    engine = EngineWorker("mailbox")
+    try:
+        engine.search(timeLimitMs=60000)
+        engine.cancel()
+        assert engine.poll() is None
+        engine.search(nodeLimit=500)
+        assert engine.waitForMove(TIMEOUT) is not None
+    finally:
+        engine.quit()
+
+
+def test_ponder_hit_answers_the_expected_reply_and_a_miss_searches_again():
+    engine = EngineWorker("bitboard")
+    try:
+        engine.setPosition(None, ["e2e4"])
+        engine.search(nodeLimit=3000)
+        ourMove = engine.waitForMove(TIMEOUT)
+        moves = ["e2e4", ourMove]
+        engine.setPosition(None, moves)
+        engine.ponder()
+        # the reply is known when pondering starts, so an instant hit is a hit
+        expected = engine.ponderMove
+        assert expected is not None and engine.ponderHit(expected, 200)
+        answer = engine.waitForMove(TIMEOUT)
+        gs = ChessEngine.newGameState()
+        for text in moves + [expected, answer]:
+            gs.makeMove(gs.getMoveFromUCI(text))
+
+        # the worker continues from the position the ponder hit left it in
+        moves += [expected, answer]
+        engine.setPosition(None, moves)
+        engine.ponder()
+        assert not engine.ponderHit("a0a0", 200)
+        validMoves = gs.getValidMoves()
+        reply = next(move.getUCINotation() for move in validMoves if move.getUCINotation() != engine.ponderMove)
+        engine.setPosition(None, moves + [reply])
+        engine.search(nodeLimit=1000)
+        gs.makeMove(gs.getMoveFromUCI(reply))
+        gs.getMoveFromUCI(engine.waitForMove(TIMEOUT))
+    finally:
+        engine.quit()
+
+
+def test_a_bad_position_command_keeps_the_previous_position_and_game_over_is_not_pondered():
+    engine = EngineWorker("mailbox")
+    try:
+        engine.setPosition(None, ["e2e4", "e7e5"])
+        engine.setPosition(None, ["e2e4", "e7e5", "g1f3", "e8e6"])
+        engine.setPosition("not a fen", [])
+        engine.search(nodeLimit=500)
+        gs = ChessEngine.newGameState()
+        for text in ["e2e4", "e7e5"]:
+            gs.makeMove(gs.getMoveFromUCI(text))
+        gs.getMoveFromUCI(engine.waitForMove(TIMEOUT))
+
+        # fool's mate: with white mated there is nothing to ponder on
+        engine.setPosition(None, ["f2f3", "e7e5", "g2g4", "d8h4"])
+        engine.ponder()
+        engine.setPosition(None, ["e2e4"])
+        engine.search(nodeLimit=500)
+        assert engine.waitForMove(TIMEOUT) is not None
+    finally:
+        engine.quit()
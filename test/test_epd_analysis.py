@@ -0,0 +1,53 @@
+import io
+import json
+
+import ChessEngine
+from EpdAnalysis import analyse, readPositions
+
+EPD = """# a comment
+rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - bm e4; id "start";
+r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1
+7k/5Q2/6K1/8/8/8/8/8 b - - 0 1
+not a position at all
+4k3/8/8/8/8/8/8/4K3 w - - 0 1
+"""
+
+
+def test_positions_are_read_as_fen_with_their_epd_id():
+    positions = list(readPositions(io.StringIO(EPD)))
+    assert [position[0] for position in positions] == [2, 3, 4, 5, 6]
+    assert positions[0] == (2, "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -", "start")
+    assert positions[1][2] is None
+
+
+def test_results_come_out_in_input_order_from_the_pool():
+    out = io.StringIO()
+    limits = {"maxDepth": 2, "timeLimitMs": None, "nodeLimit": None}
+    assert analyse(io.StringIO(EPD * 3), out, limits, workers=2) == 15
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [result["line"] for result in results] == [2, 3, 4, 5, 6, 8, 9, 10, 11, 12, 14, 15, 16, 17, 18]
+    start, kiwipete, stalemate, invalid, bareKings = results[:5]
+    assert "error" in invalid
+    assert start["id"] == "start" and start["depth"] == 2 and start["nodes"] > 0
+    assert start["fen"] == "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+    gs = ChessEngine.newGameState("bitboard", kiwipete["fen"])
+    assert gs.getMoveFromSAN(kiwipete["san"]).getUCINotation() == kiwipete["bestmove"]
+    assert stalemate["bestmove"] is None and stalemate["result"] == "stalemate"
+    assert bareKings["bestmove"] is not None
+
+
+def test_a_bad_position_gives_an_error_line_and_the_run_goes_on():
+    lines = [
+        "4k3/8/8/8/8/8/8/4K2R w K - 0 1",
+        "4k3/4Q3/8/8/8/8/8/4K3 w - - 0 1",
+        "4k3/8/8/8/8/8/8/p3K3 b - - 0 1",
+        "4k3/8/8/8/8/8/8/K3K3 w - - 0 1",
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    ]
+    limits = {"maxDepth": 2, "timeLimitMs": None, "nodeLimit": None}
+    for backend in ChessEngine.BACKENDS:
+        out = io.StringIO()
+        assert analyse(lines, out, limits, workers=2, backend=backend) == 5
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert ["error" in result for result in results] == [False, True, True, True, False]
+        assert results[0]["bestmove"] is not None and results[-1]["depth"] == 2
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+import ChessAI
+import ChessEngine
+
+
+def legacyScoreBoard(gs):
+    # scoreBoard as it was before the running totals, floating point and all
+    score = 0
+    for row in range(8):
+        for col in range(8):
+            square = gs.board[row][col]
+            if square != "--":
+                piecePositionScore = 0
+                if square[1] == "P":
+                    piecePositionScore = ChessAI.piecePositionScores[square][row][col]
+                elif square[1] != "K":
+                    piecePositionScore = ChessAI.piecePositionScores[square[1]][row][col]
+                if square[0] == "w":
+                    score += ChessAI.pieceScore[square[1]] + piecePositionScore * .1
+                else:
+                    score -= ChessAI.pieceScore[square[1]] - piecePositionScore * .1
+    return score
+
+
+def test_running_totals_match_the_full_scan():
+    rng = random.Random(4)
+    for backend in ChessEngine.BACKENDS:
+        for _ in range(15):
+            gs = ChessEngine.newGameState(backend)
+            for _ in range(150):
+                moves = gs.getValidMoves()
+                if not moves:
+                    break
+                captures = [m for m in moves if m.isCapture or m.isPawnPromotion or m.isCastleMove]
+                gs.makeMove(rng.choice(captures) if captures and rng.random() < 0.5 else rng.choice(moves))
+                if rng.random() < 0.2:
+                    gs.undoMove()
+                assert ChessAI.scoreBoard(gs) == ChessAI.scoreBoardScan(gs)
+                if not (gs.checkMate or gs.staleMate):
+                    assert ChessAI.scoreBoard(gs) == pytest.approx(legacyScoreBoard(gs), abs=1e-9)
+            while gs.moveLog:
+                gs.undoMove()
+            assert gs.materialScore == {"w": 39, "b": 39}
+            assert ChessAI.scoreBoard(gs) == ChessAI.scoreBoardScan(gs)
+
+
+def test_enpassant_capture_updates_the_totals():
+    gs = ChessEngine.newGameState()
+    for start, end in [((6, 4), (4, 4)), ((1, 0), (2, 0)), ((4, 4), (3, 4)), ((1, 3), (3, 3))]:
+        gs.makeMove(ChessEngine.Move(start, end, gs.board))
+    enpassant = [m for m in gs.getValidMoves() if m.isEnpassantMove]
+    assert len(enpassant) == 1
+    gs.makeMove(enpassant[0])
+    assert gs.materialScore == {"w": 39, "b": 38}
+    assert ChessAI.scoreBoard(gs) == ChessAI.scoreBoardScan(gs)
+    gs.undoMove()
+    assert ChessAI.scoreBoard(gs) == ChessAI.scoreBoardScan(gs)
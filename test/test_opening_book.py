@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+import ChessAI
+import ChessEngine
+from OpeningBook import OpeningBook, buildBook
+
+PGN = """[Event "one"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 {main line} Nc6 (2... d6 3. d4) 3. Bb5 a6 4. O-O 1-0
+
+[Event "two"]
+[Result "0-1"]
+
+1. d4 d5 2. c4 e6 $1 0-1
+"""
+
+
+class ListQueue:
+    def __init__(self):
+        self.items = []
+
+    def put(self, item):
+        self.items.append(item)
+
+
+def makeBook(tmp_path):
+    pgnPath = tmp_path / "games.pgn"
+    pgnPath.write_text(PGN)
+    bookPath = tmp_path / "book.bin"
+    assert buildBook([str(pgnPath)], str(bookPath)) == 6
+    return str(bookPath)
+
+
+def test_book_moves_follow_the_games(tmp_path):
+    book = OpeningBook(makeBook(tmp_path))
+    gs = ChessEngine.newGameState()
+    # white won the first game and lost the second, so only e4 is in the book
+    assert book.findMove(gs).getUCINotation() == "e2e4"
+    for text in ["d2d4"]:
+        gs.makeMove(gs.getMoveFromUCI(text))
+    assert book.findMove(gs).getUCINotation() == "d7d5"
+    for text in ["d7d5", "c2c4"]:
+        gs.makeMove(gs.getMoveFromUCI(text))
+    assert book.findMove(gs).getUCINotation() == "e7e6"
+    gs = ChessEngine.newGameState()
+    for text in ["e2e4", "e7e5", "g1f3", "b8c6", "f1b5", "a7a6"]:
+        gs.makeMove(gs.getMoveFromUCI(text))
+    castle = book.findMove(gs, rng=random.Random(1))
+    assert castle.isCastleMove
+    book.close()
+
+
+def test_find_best_move_plays_from_the_book(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(ChessAI, "openingBook", None)
+    ChessAI.useOpeningBook(makeBook(tmp_path))
+    gs = ChessEngine.newGameState()
+    queue = ListQueue()
+    move, stats = ChessAI.findBestMove(gs, gs.getValidMoves(), queue)
+    ChessAI.useOpeningBook(None)
+    assert queue.items[0].getUCINotation() == "e2e4" and move is queue.items[0]
+    assert stats.source == "book" and str(stats) == "book move"
+    assert capsys.readouterr().out == ""
+
+
+def test_san_disambiguation():
+    gs = ChessEngine.newGameState("mailbox", "4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1")
+    assert gs.getMoveFromSAN("Rad1").startCol == 0
+    assert gs.getMoveFromSAN("O-O").isCastleMove
+    gs = ChessEngine.newGameState("mailbox", "4k3/8/8/8/8/8/8/1N3N1K w - - 0 1")
+    assert gs.getMoveFromSAN("Nfd2").startCol == 5
+    with pytest.raises(ValueError):
+        gs.getMoveFromSAN("Nd2")
@@ -0,0 +1,34 @@
+import pytest
+
+import ChessEngine
+import Perft
+
+
+def test_standard_positions_match_reference_counts():
+    for backend in ChessEngine.BACKENDS:
+        for name in Perft.POSITIONS:
+            assert Perft.checkPosition(name, 2, backend), (backend, name)
+
+
+def test_divide_sums_to_perft():
+    gs = ChessEngine.newGameState("bitboard", Perft.POSITIONS["kiwipete"][0])
+    counts = Perft.divide(gs, 2)
+    assert len(counts) == 48
+    assert ("e1g1", 43) in counts
+    assert sum(nodes for _, nodes in counts) == 2039
+
+
+def test_fen_sets_up_the_position():
+    for backend in ChessEngine.BACKENDS:
+        gs = ChessEngine.newGameState(backend, "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1")
+        assert not gs.whiteToMove
+        assert gs.enpassantPossible == (5, 3)
+        assert gs.blackKingLocation == (2, 1)
+        assert gs.zobristKey == gs.computeZobristKey()
+
+
+def test_invalid_fen_is_rejected():
+    with pytest.raises(ValueError):
+        ChessEngine.newGameState("mailbox", "8/8/8/8/8/8/8/8 w - - 0 1")
+    with pytest.raises(ValueError):
+        ChessEngine.newGameState("mailbox", "rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
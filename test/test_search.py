@@ -0,0 +1,136 @@
+import ChessAI
+import ChessEngine
+
+
+class ListQueue:
+    def __init__(self):
+        self.items = []
+
+    def put(self, item):
+        self.items.append(item)
+
+
+def test_node_limit_returns_a_legal_move_and_restores_the_position():
+    gs = ChessEngine.newGameState()
+    key = gs.zobristKey
+    validMoves = gs.getValidMoves()
+    queue = ListQueue()
+    move, stats = ChessAI.findBestMove(gs, validMoves, queue, nodeLimit=2000)
+    assert queue.items[0] is move and move in validMoves
+    assert stats.totalNodes() < 2000 + 256
+    assert gs.zobristKey == key and gs.moveLog == []
+
+
+def test_time_limit_is_respected():
+    gs = ChessEngine.newGameState()
+    queue = ListQueue()
+    ChessAI.findBestMove(gs, gs.getValidMoves(), queue, timeLimitMs=200)
+    assert queue.items[0] is not None
+
+
+def test_stats_count_each_iteration_and_profiling_is_removed_again():
+    gs = ChessEngine.newGameState()
+    makeMove = ChessEngine.BitboardGameState.makeMove
+    ChessAI.enableProfiling()
+    try:
+        _, stats = ChessAI.findBestMove(gs, gs.getValidMoves(), ListQueue(), nodeLimit=3000)
+    finally:
+        ChessAI.disableProfiling()
+    assert ChessEngine.BitboardGameState.makeMove is makeMove
+    assert [depth for depth, _, _ in stats.depths] == list(range(1, len(stats.depths) + 1))
+    assert sum(nodes for _, _, nodes in stats.depths) <= stats.totalNodes()
+    assert stats.hashProbes > 0 and stats.betaCutoffs > 0
+    assert set(stats.sectionSeconds) == {"movegen", "make/undo", "eval"}
+    assert sum(stats.sectionSeconds.values()) < stats.seconds
+
+
+def test_order_moves_puts_hash_move_then_captures_then_killers_first():
+    gs = ChessEngine.newGameState()
+    for start, end in [((6, 4), (4, 4)), ((1, 3), (3, 3))]:
+        gs.makeMove(ChessEngine.Move(start, end, gs.board))
+    validMoves = gs.getValidMoves()
+    quiet = [m for m in validMoves if not m.isCapture]
+    hashMove, killer = quiet[0], quiet[1]
+    ply = 3
+    ChessAI.killerMoves[ply] = [killer.moveID, 0]
+    ordered = ChessAI.orderMoves(validMoves, hashMove.moveID, ply)
+    assert ordered[0] is hashMove
+    assert str(ordered[1]) == "exd5"
+    assert ordered[2] is killer
+    ChessAI.killerMoves[ply] = [0, 0]
+
+
+def test_quiescence_sees_the_recapture_beyond_the_horizon(monkeypatch):
+    # 1. e4 e5 2. Qh5 Nc6: Qxf7+ and Qxe5+ win a pawn at depth 1 but lose the queen
+    monkeypatch.setattr(ChessAI, "DEPTH", 1)
+    gs = ChessEngine.newGameState()
+    for start, end in [((6, 4), (4, 4)), ((1, 4), (3, 4)), ((7, 3), (3, 7)), ((0, 1), (2, 2))]:
+        gs.makeMove(ChessEngine.Move(start, end, gs.board))
+    queue = ListQueue()
+    _, stats = ChessAI.findBestMove(gs, gs.getValidMoves(), queue)
+    assert not (queue.items[0].pieceMoved == "wQ" and queue.items[0].isCapture)
+    assert stats.quiescenceNodes > 0
+
+
+def test_parallel_search_returns_a_legal_move():
+    gs = ChessEngine.newGameState()
+    validMoves = gs.getValidMoves()
+    queue = ListQueue()
+    move, stats = ChessAI.findBestMoveParallel(gs, validMoves, queue, nodeLimit=1500, workers=2)
+    assert queue.items[0] is move and move in validMoves
+    assert stats.totalNodes() >= 1500
+
+
+def test_staged_moves_yield_every_legal_move_once():
+    fen = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+    for backend in ChessEngine.BACKENDS:
+        gs = ChessEngine.newGameState(backend, fen)
+        validMoves = gs.getValidMoves()
+        hashMove = gs.getMoveFromUCI("e1g1")
+        ply = 2
+        killer = gs.getMoveFromUCI("a2a3")
+        ChessAI.killerMoves[ply] = [killer.moveID, 0]
+        staged = list(ChessAI.stagedMoves(gs, hashMove.moveID, ply))
+        ChessAI.killerMoves[ply] = [0, 0]
+        assert sorted(m.moveID for m in staged) == sorted(m.moveID for m in validMoves)
+        assert staged[0] == hashMove
+        captures = [m for m in staged if m.isCapture]
+        # winning captures come before the killer, quiet moves before losing ones
+        assert staged.index(killer) > staged.index(captures[0])
+        for move in staged[staged.index(killer):]:
+            if move.isCapture:
+                assert ChessAI.pieceScore[move.pieceCaptured[1]] < ChessAI.pieceScore[move.pieceMoved[1]]
+
+
+def test_search_scores_a_repetition_as_a_draw():
+    gs = ChessEngine.newGameState()
+    for text in ["g1f3", "g8f6", "f3g1"]:
+        gs.makeMove(gs.getMoveFromUCI(text))
+    back = gs.getMoveFromUCI("f6g8")
+    results = list(ChessAI.searchIterations(gs, [back], maxDepth=1))
+    assert results[-1][1] == ChessAI.STALEMATE
+
+
+def test_search_sees_a_mate_given_on_the_hundredth_ply():
+    gs = ChessEngine.newGameState("bitboard", "7k/8/6K1/8/8/8/8/R7 w - - 99 80")
+    depth, score, move = list(ChessAI.searchIterations(gs, gs.getValidMoves(), maxDepth=2))[-1]
+    assert move.getUCINotation() == "a1a8" and score == ChessAI.CHECKMATE - 1
+
+
+def test_search_scores_a_stalemate_below_the_root_as_a_draw():
+    # Qc7 stalemates, every other queen move keeps the win
+    gs = ChessEngine.newGameState("bitboard", "k7/8/8/2Q5/8/8/8/K7 w - - 0 1")
+    stalemating = gs.getMoveFromUCI("c5c7")
+    results = list(ChessAI.searchIterations(gs, [stalemating], maxDepth=2))
+    assert results[-1][1] == ChessAI.STALEMATE
+
+
+def test_mates_are_scored_by_their_distance():
+    # Kb6 Kb8 Rh8#; a deeper iteration keeps the distance through the hash table
+    gs = ChessEngine.newGameState("bitboard", "k7/8/2K5/8/8/8/8/7R w - - 0 1")
+    results = list(ChessAI.searchIterations(gs, gs.getValidMoves(), startDepth=4, maxDepth=5))
+    assert results[0][1] == ChessAI.CHECKMATE - 3
+    # Kb8 Rh8#
+    gs = ChessEngine.newGameState("bitboard", "k7/8/1K6/8/8/8/8/7R b - - 0 1")
+    results = list(ChessAI.searchIterations(gs, gs.getValidMoves(), maxDepth=3))
+    assert results[-1][1] == -(ChessAI.CHECKMATE - 2)
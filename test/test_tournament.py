@@ -0,0 +1,38 @@
+import io
+import math
+
+import ChessEngine
+from OpeningBook import readPgnGames, tokenizeMovetext
+from Tournament import ADJUDICATION, parseSettings, runTournament, summarize
+
+
+def test_games_are_written_as_replayable_pgn():
+    # black to move, so the movetext starts with "1..."
+    fen = "4k3/8/8/8/8/8/4P3/4K2R b K - 0 1"
+    settings = (parseSettings("depth=1"), parseSettings("depth=2,nodes=2000"))
+    adjudication = dict(ADJUDICATION, maxPlies=12)
+    pgn = io.StringIO()
+    games = runTournament(2, settings, [fen], adjudication, pgnFile=pgn)
+
+    assert [(game["white"], game["black"]) for game in games] == [("engine1", "engine2"), ("engine2", "engine1")]
+    assert "1... " in pgn.getvalue()
+    for game, (result, lines) in zip(games, readPgnGames(pgn.getvalue())):
+        assert result == game["result"]
+        gs = ChessEngine.newGameState("bitboard", fen)
+        for san in tokenizeMovetext(lines):
+            gs.makeMove(gs.getMoveFromSAN(san))
+        assert len(gs.moveLog) == len(game["moves"]) <= 12
+
+
+def test_summary_counts_results_for_either_colour():
+    games = [
+        {"white": "engine1", "black": "engine2", "result": "1-0"},
+        {"white": "engine2", "black": "engine1", "result": "1-0"},
+        {"white": "engine1", "black": "engine2", "result": "1/2-1/2"},
+        {"white": "engine2", "black": "engine1", "result": "0-1"},
+    ]
+    wins, draws, losses, elo, low, high = summarize(games, "engine1")
+    assert (wins, draws, losses) == (2, 1, 1)
+    assert math.isclose(elo, -400 * math.log10(1 / 0.625 - 1))
+    assert low < elo < high
+    assert summarize(games[:1], "engine1")[3] == math.inf
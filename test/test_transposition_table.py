@@ -0,0 +1,43 @@
+from TranspositionTable import ENTRY_BYTES, EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable, tableBytes
+
+
+def test_store_and_probe():
+    table = TranspositionTable(1)
+    assert table.probe(12345) is None
+    table.store(12345, 3, 1.5, LOWER_BOUND, 6434)
+    assert table.probe(12345) == (3, 1.5, LOWER_BOUND, 6434)
+    assert table.hitRate() == 0.5
+
+
+def test_deep_entries_survive_shallow_collisions():
+    table = TranspositionTable(1)
+    buckets = table.mask + 1
+    deep, shallow, newer = 7, 7 + buckets, 7 + 2 * buckets
+    table.store(deep, 5, 1.0, EXACT)
+    table.store(shallow, 1, 2.0, UPPER_BOUND)
+    table.store(newer, 1, 3.0, EXACT)
+    assert table.probe(deep) == (5, 1.0, EXACT, 0)
+    assert table.probe(shallow) is None
+    assert table.probe(newer) == (1, 3.0, EXACT, 0)
+    assert table.fillRatio() == 2 / table.size
+
+
+def test_size_follows_memory_budget():
+    assert TranspositionTable(2).size == 2 * TranspositionTable(1).size
+    assert TranspositionTable(1).size * ENTRY_BYTES <= 1024 * 1024
+
+
+def test_tables_over_one_buffer_share_entries():
+    buffer = bytearray(tableBytes(1))
+    writer, reader = TranspositionTable(1, buffer), TranspositionTable(1, buffer)
+    writer.store(99, 4, -12.3, EXACT, 1234)
+    assert reader.probe(99) == (4, -12.3, EXACT, 1234)
+
+
+def test_torn_entry_fails_the_key_check():
+    table = TranspositionTable(1)
+    table.store(99, 4, 0.5, EXACT)
+    # another process overwrote data but not yet the key
+    slot = (99 & table.mask) << 1
+    table.data[slot] ^= 1 << 10
+    assert table.probe(99) is None
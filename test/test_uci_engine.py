@@ -0,0 +1,104 @@
+import io
+import queue
+import subprocess
+import sys
+from pathlib import Path
+
+import ChessAI
+import ChessEngine
+from UciEngine import UciEngine
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+TIMEOUT = 60 # seconds to wait for the engine before the test fails instead of hanging
+
+
+class LineQueue:
+    # output for UciEngine that hands over each line as it is written
+    def __init__(self):
+        self.lines = queue.Queue()
+
+    def write(self, text):
+        for line in text.splitlines():
+            self.lines.put(line)
+
+    def flush(self):
+        pass
+
+    def waitFor(self, prefix):
+        # the lines written up to and including the first one starting with prefix
+        lines = []
+        while not lines or not lines[-1].startswith(prefix):
+            lines.append(self.lines.get(timeout=TIMEOUT))
+        return lines
+
+
+def run(engine, *commands):
+    for command in commands:
+        engine.handle(command)
+
+
+def bestMove(out):
+    lines = [line for line in out.getvalue().splitlines() if line.startswith("bestmove")]
+    return lines[-1].split()
+
+
+def test_go_depth_reports_each_iteration_and_a_legal_move():
+    out = io.StringIO()
+    engine = UciEngine(out)
+    run(engine, "position startpos moves e2e4 e7e5", "go depth 3")
+    engine.searchThread.join(TIMEOUT)
+    infos = [line.split() for line in out.getvalue().splitlines() if line.startswith("info depth")]
+    assert [int(info[2]) for info in infos] == [1, 2, 3]
+    answer = bestMove(out)
+    assert infos[-1][infos[-1].index("pv") + 1] == answer[1]
+    gs = ChessEngine.newGameState()
+    for text in ["e2e4", "e7e5", answer[1]] + answer[3:4]:
+        gs.makeMove(gs.getMoveFromUCI(text))
+
+
+def test_mate_scores_report_the_distance_of_the_mate():
+    out = io.StringIO()
+    engine = UciEngine(out)
+    run(engine, "position fen k7/8/2K5/8/8/8/8/7R w - - 0 1", "go depth 5")
+    engine.searchThread.join(TIMEOUT)
+    assert " score mate 2 " in out.getvalue().splitlines()[-2]
+    # a mate found in a deep iteration is still reported by its own distance
+    move = engine.gs.getMoveFromUCI("c6b6")
+    out.seek(0)
+    out.truncate()
+    engine.sendInfo(8, ChessAI.CHECKMATE - 3, move)
+    engine.sendInfo(8, -(ChessAI.CHECKMATE - 2), move)
+    engine.sendInfo(8, 1.5, move)
+    assert [line.split()[4:6] for line in out.getvalue().splitlines()] == [["mate", "2"], ["mate", "-1"], ["cp", "150"]]
+
+
+def test_infinite_and_ponder_searches_answer_only_when_told():
+    out = LineQueue()
+    engine = UciEngine(out)
+    run(engine, "position fen 7k/8/8/8/8/8/8/K5R1 w - - 0 1", "go infinite")
+    # the search is well under way and has not answered
+    assert not any(line.startswith("bestmove") for line in out.waitFor("info depth 4"))
+    run(engine, "stop")
+    gs = ChessEngine.newGameState("bitboard", "7k/8/8/8/8/8/8/K5R1 w - - 0 1")
+    gs.getMoveFromUCI(out.waitFor("bestmove")[-1].split()[1])
+
+    run(engine, "position startpos", "go ponder wtime 1000 btime 1000")
+    assert not any(line.startswith("bestmove") for line in out.waitFor("info depth 3"))
+    run(engine, "ponderhit")
+    answer = out.waitFor("bestmove")[-1].split()
+    ChessEngine.newGameState().getMoveFromUCI(answer[1])
+
+
+def test_front_end_runs_over_pipes_without_pygame():
+    commands = "uci\nsetoption name Hash value 2\nisready\nposition startpos moves d2d4\ngo nodes 500\nquit\n"
+    script = "import sys, runpy; sys.path.insert(0, %r); sys.argv = ['UciEngine.py']; runpy.run_path(%r, run_name='__main__')" % (
+        str(SRC),
+        str(SRC / "UciEngine.py"),
+    )
+    check = "import sys; import UciEngine; assert 'pygame' not in sys.modules"
+    subprocess.run([sys.executable, "-c", check], cwd=SRC, check=True)
+    result = subprocess.run([sys.executable, "-c", script], input=commands, capture_output=True, text=True, timeout=60)
+    lines = result.stdout.splitlines()
+    assert "uciok" in lines and "readyok" in lines
+    assert lines[-1].startswith("bestmove ")
+    assert all(line.split()[0] in ("id", "option", "uciok", "readyok", "info", "bestmove") for line in lines)
@@ -0,0 +1,47 @@
+import random
+
+import ChessEngine
+
+
+def playMoves(gs, squares):
+    for start, end in squares:
+        gs.makeMove(ChessEngine.Move(start, end, gs.board))
+
+
+def test_incremental_key_matches_recomputation(monkeypatch):
+    monkeypatch.setattr(ChessEngine, "ZOBRIST_DEBUG", True)
+    rng = random.Random(3)
+    for backend in ChessEngine.BACKENDS:
+        for _ in range(10):
+            gs = ChessEngine.newGameState(backend)
+            for _ in range(120):
+                moves = gs.getValidMoves()
+                if not moves:
+                    break
+                gs.makeMove(rng.choice(moves))
+                if rng.random() < 0.2:
+                    gs.undoMove()
+            while gs.moveLog:
+                gs.undoMove()
+            assert gs.zobristKey == ChessEngine.newGameState(backend).zobristKey
+
+
+def test_transpositions_share_a_key():
+    a = ChessEngine.GameState()
+    b = ChessEngine.GameState()
+    playMoves(a, [((7, 6), (5, 5)), ((0, 6), (2, 5)), ((7, 1), (5, 2))])
+    playMoves(b, [((7, 1), (5, 2)), ((0, 6), (2, 5)), ((7, 6), (5, 5))])
+    assert a.zobristKey == b.zobristKey
+    assert a.zobristKey != ChessEngine.GameState().zobristKey
+
+
+def test_side_to_move_and_enpassant_change_the_key():
+    a = ChessEngine.GameState()
+    b = ChessEngine.GameState()
+    playMoves(a, [((6, 4), (4, 4)), ((0, 1), (2, 2)), ((7, 6), (5, 5))])
+    playMoves(b, [((7, 6), (5, 5)), ((0, 1), (2, 2)), ((6, 4), (4, 4))])
+    assert a.board == b.board and a.enpassantPossible == () and b.enpassantPossible == (5, 4)
+    assert a.zobristKey ^ b.zobristKey == ChessEngine.ZOBRIST_ENPASSANT[4]
+
+    a.whiteToMove = not a.whiteToMove
+    assert a.computeZobristKey() ^ a.zobristKey == ChessEngine.ZOBRIST_BLACK_TO_MOVE